@@ -1,3 +1,6 @@
+import asyncio
+import os
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta, timezone
 from typing import Annotated
 
@@ -8,19 +11,31 @@ from jwt.exceptions import InvalidTokenError
 from passlib.context import CryptContext
 
 from api.models import User
-from api.schema import TokenData, UserCreate, Token, GetUser
-from sqlalchemy.orm import Session
+from api.schema import TokenData, UserCreate, Token, GetUser, UserBatchRequest
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 
 from api.logger import logger  # for logging
+from api.cache import user_cache
 
 # to get a string like this run:
 # openssl rand -hex 32
-SECRET_KEY = "09d25e094faa6ca2556c818166b7a9563b93f7099f6f0f4caa6cf63b88e8d3e7"
-ALGORITHM = "HS256"
+SECRET_KEY = os.getenv("JWT_SECRET_KEY", "09d25e094faa6ca2556c818166b7a9563b93f7099f6f0f4caa6cf63b88e8d3e7")
+ALGORITHM = os.getenv("JWT_ALGORITHM", "HS256")
 ACCESS_TOKEN_EXPIRE_MINUTES = 60
 
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 
+# bcrypt is CPU bound (and releases the GIL), so it runs on a bounded worker pool
+# instead of the event loop. At most BCRYPT_MAX_PENDING hashes may be queued or running;
+# callers that cannot get a slot within BCRYPT_QUEUE_TIMEOUT_SECONDS are rejected with 503.
+BCRYPT_MAX_WORKERS = int(os.getenv("BCRYPT_MAX_WORKERS", os.cpu_count() or 1))
+BCRYPT_MAX_PENDING = int(os.getenv("BCRYPT_MAX_PENDING", 4 * BCRYPT_MAX_WORKERS))
+BCRYPT_QUEUE_TIMEOUT_SECONDS = float(os.getenv("BCRYPT_QUEUE_TIMEOUT_SECONDS", 5))
+
+hashing_executor = ThreadPoolExecutor(max_workers=BCRYPT_MAX_WORKERS, thread_name_prefix="bcrypt")
+hashing_slots = asyncio.Semaphore(BCRYPT_MAX_PENDING)
+
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token")
 
 
@@ -32,17 +47,51 @@ def get_password_hash(password):
     return pwd_context.hash(password)
 
 
-def get_user(db: Session, username: str):
-    return db.query(User).filter(User.username == username).first()
+async def run_hashing(func, *args):
+    try:
+        await asyncio.wait_for(hashing_slots.acquire(), timeout=BCRYPT_QUEUE_TIMEOUT_SECONDS)
+    except asyncio.TimeoutError:
+        logger.error("Password hashing pool saturated, rejecting request")
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Authentication is temporarily overloaded. Please try again later.",
+            headers={"Retry-After": "1"},
+        )
+    try:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(hashing_executor, func, *args)
+    finally:
+        hashing_slots.release()
+
+
+async def verify_password_async(plain_password, hashed_password):
+    return await run_hashing(verify_password, plain_password, hashed_password)
+
 
+async def get_password_hash_async(password):
+    return await run_hashing(get_password_hash, password)
 
-def authenticate_user(db, username: str, password: str):
+
+async def get_user(db: AsyncSession, username: str):
+    result = await db.execute(select(User).where(User.username == username))
+    return result.scalars().first()
+
+
+# Look up many users in one query (used by other services for enrichment)
+async def get_users_by_ids(request: UserBatchRequest, db: AsyncSession):
+    result = await db.execute(select(User).where(User.id.in_(set(request.ids))))
+    users = [GetUser.model_validate(user) for user in result.scalars().all()]
+    logger.info(f"Batch user lookup found {len(users)} of {len(request.ids)} users")
+    return users
+
+
+async def authenticate_user(db, username: str, password: str):
     logger.info(f"Authentication attempt for user: {username}")
 
-    user = get_user(db, username)
+    user = await get_user(db, username)
     if not user:
         return False
-    if not verify_password(password, user.password):
+    if not await verify_password_async(password, user.password):
         return False
     return user
 
@@ -60,7 +109,7 @@ def create_access_token(data: dict, expires_delta: timedelta | None = None):
     return encoded_jwt
 
 
-def get_current_user(token: Annotated[str, Depends(oauth2_scheme)], db: Session):
+async def get_current_user(token: Annotated[str, Depends(oauth2_scheme)], db: AsyncSession):
     logger.info("Token validation attempt")
 
     credentials_exception = HTTPException(
@@ -76,17 +125,28 @@ def get_current_user(token: Annotated[str, Depends(oauth2_scheme)], db: Session)
         token_data = TokenData(username=username)
     except InvalidTokenError:
         raise credentials_exception
-    user = get_user(db, username=token_data.username)
+    cached_user = user_cache.get(token_data.username)
+    if cached_user is not None:
+        return cached_user
+
+    user = await get_user(db, username=token_data.username)
     if user is None:
         raise credentials_exception
 
-    return GetUser.model_validate(user)
+    current_user = GetUser.model_validate(user)
+    user_cache.set(current_user.username, current_user)
+    return current_user
+
+
+# Call after any change to a user row so verification never serves stale data
+def invalidate_user(username: str):
+    user_cache.invalidate(username)
 
 
-def login_user(form_data: Annotated[OAuth2PasswordRequestForm, Depends()], db: Session) -> Token:
+async def login_user(form_data: Annotated[OAuth2PasswordRequestForm, Depends()], db: AsyncSession) -> Token:
     logger.info(f"Login attempt for user: {form_data.username}")
 
-    user = authenticate_user(db, form_data.username, form_data.password)
+    user = await authenticate_user(db, form_data.username, form_data.password)
     if not user:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
@@ -94,19 +154,21 @@ def login_user(form_data: Annotated[OAuth2PasswordRequestForm, Depends()], db: S
             headers={"WWW-Authenticate": "Bearer"},
         )
     access_token_expires = timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
-    access_token = create_access_token(data={"sub": user.username}, expires_delta=access_token_expires)
+    access_token = create_access_token(data={"sub": user.username, "id": user.id}, expires_delta=access_token_expires)
     return Token(access_token=access_token, token_type="bearer")
 
 
-def register_user(user: UserCreate, db: Session):
+async def register_user(user: UserCreate, db: AsyncSession):
     logger.info(f"User registration attempt: {user.username}")
 
-    db_user = User(username=user.username, email=user.email, password=get_password_hash(user.password))
+    hashed_password = await get_password_hash_async(user.password)
+    db_user = User(username=user.username, email=user.email, password=hashed_password)
     db.add(db_user)
-    db.commit()
-    db.refresh(db_user)
+    await db.commit()
+    await db.refresh(db_user)
+    invalidate_user(db_user.username)
 
     access_token_expires = timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
-    access_token = create_access_token(data={"sub": db_user.username}, expires_delta=access_token_expires)
+    access_token = create_access_token(data={"sub": db_user.username, "id": db_user.id}, expires_delta=access_token_expires)
 
     return Token(access_token=access_token, token_type="bearer")
@@ -0,0 +1,56 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from metrics import USER_CACHE_HITS, USER_CACHE_MISSES, USER_CACHE_EVICTIONS
+
+USER_CACHE_SIZE = int(os.getenv("USER_CACHE_SIZE", 10000))
+USER_CACHE_TTL_SECONDS = float(os.getenv("USER_CACHE_TTL_SECONDS", 300))
+
+
+class TTLCache:
+    """
+    Bounded LRU cache whose entries expire after a fixed time-to-live
+    """
+
+    def __init__(self, max_size, ttl_seconds):
+        self.max_size = max_size
+        self.ttl_seconds = ttl_seconds
+        self._data = OrderedDict()  # key -> (expires_at, value)
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                USER_CACHE_MISSES.inc()
+                return None
+            expires_at, value = entry
+            if expires_at <= time.monotonic():
+                del self._data[key]
+                USER_CACHE_MISSES.inc()
+                return None
+            self._data.move_to_end(key)
+            USER_CACHE_HITS.inc()
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._data[key] = (time.monotonic() + self.ttl_seconds, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_size:
+                self._data.popitem(last=False)
+                USER_CACHE_EVICTIONS.inc()
+
+    def invalidate(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+
+# Users keyed by username
+user_cache = TTLCache(USER_CACHE_SIZE, USER_CACHE_TTL_SECONDS)
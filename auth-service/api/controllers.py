@@ -1,10 +1,11 @@
 from fastapi import APIRouter, Depends
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 from api import auth
-from databaseConfig import get_db
-from typing import Annotated
+from databaseConfig import get_async_db
+from typing import Annotated, List
 from fastapi.security import OAuth2PasswordRequestForm
-from api.schema import Token, UserCreate, GetUser
+from api.schema import Token, UserCreate, GetUser, UserBatchRequest
+from api.service_auth import verify_service_token
 
 # Add logging here if necessary
 
@@ -13,20 +14,28 @@ router = APIRouter()
 @router.get("/verify-token")
 async def get_current_user(
     token: Annotated[str, Depends(auth.oauth2_scheme)],
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ) -> GetUser:
-    return auth.get_current_user(token, db)
+    return await auth.get_current_user(token, db)
 
 @router.post("/token")
 async def login(
     form_data: Annotated[OAuth2PasswordRequestForm, Depends()],
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ) -> Token:
-    return auth.login_user(form_data, db)
+    return await auth.login_user(form_data, db)
 
 @router.post("/register")
 async def register_user(
     user: UserCreate,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ) -> Token:
-    return auth.register_user(user, db)
\ No newline at end of file
+    return await auth.register_user(user, db)
+
+# Service-to-service only (notification enrichment); needs the shared service credential
+@router.post("/users/batch", dependencies=[Depends(verify_service_token)])
+async def get_users_batch(
+    request: UserBatchRequest,
+    db: AsyncSession = Depends(get_async_db)
+) -> List[GetUser]:
+    return await auth.get_users_by_ids(request, db)
@@ -1,4 +1,5 @@
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
+from typing import List
 
 class UserBase(BaseModel):
     username: str
@@ -30,4 +31,10 @@ class UserInDB(UserBase):
     hashed_password: str
 
     class Config:
-        from_attributes = True
\ No newline at end of file
+        from_attributes = True
+
+# Users per batch lookup
+USER_BATCH_MAX_IDS = 500
+
+class UserBatchRequest(BaseModel):
+    ids: List[int] = Field(min_length=1, max_length=USER_BATCH_MAX_IDS)
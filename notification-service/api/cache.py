@@ -0,0 +1,53 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from metrics import ENRICHMENT_CACHE_HITS, ENRICHMENT_CACHE_MISSES
+
+ENRICHMENT_CACHE_SIZE = int(os.getenv("ENRICHMENT_CACHE_SIZE", 5000))
+ENRICHMENT_CACHE_TTL_SECONDS = float(os.getenv("ENRICHMENT_CACHE_TTL_SECONDS", 30))
+
+
+class TTLCache:
+    """
+    Bounded LRU cache whose entries expire after a fixed time-to-live
+    """
+
+    def __init__(self, name, max_size, ttl_seconds):
+        self.name = name
+        self.max_size = max_size
+        self.ttl_seconds = ttl_seconds
+        self._data = OrderedDict()  # key -> (expires_at, value)
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                ENRICHMENT_CACHE_MISSES.labels(self.name).inc()
+                return None
+            expires_at, value = entry
+            if expires_at <= time.monotonic():
+                del self._data[key]
+                ENRICHMENT_CACHE_MISSES.labels(self.name).inc()
+                return None
+            self._data.move_to_end(key)
+            ENRICHMENT_CACHE_HITS.labels(self.name).inc()
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._data[key] = (time.monotonic() + self.ttl_seconds, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_size:
+                self._data.popitem(last=False)
+
+    def invalidate(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+
+# Short-lived copies of upstream data used to enrich payment events
+ticket_cache = TTLCache("ticket", ENRICHMENT_CACHE_SIZE, ENRICHMENT_CACHE_TTL_SECONDS)
+user_cache = TTLCache("user", ENRICHMENT_CACHE_SIZE, ENRICHMENT_CACHE_TTL_SECONDS)
@@ -0,0 +1,116 @@
+import threading
+import time
+from concurrent.futures import Future
+
+from api.logger import logger
+from metrics import NOTIFICATIONS_COALESCED, DIGEST_EMAILS_SENT
+
+
+class _Digest:
+    def __init__(self, name, deadline):
+        self.name = name
+        self.deadline = deadline
+        self.sections = []  # rendered html fragments
+        self.futures = []
+
+
+class NotificationCoalescer:
+    """
+    Merges notifications for the same recipient into one digest email.
+
+    Sections added for a recipient are held until `window` seconds after the
+    first one arrived, or until `max_size` sections are waiting, then sent as
+    a single message through `send(to_email, subject, html) -> Future`.
+    Every add() returns a future that resolves once its digest is accepted
+    for delivery, so callers can ack their input only after that.
+    """
+
+    def __init__(self, send, render, window=2.0, max_size=20):
+        self.send = send
+        self.render = render  # (name, sections html) -> (subject, html)
+        self.window = window
+        self.max_size = max_size
+        self.pending = {}  # to_email -> _Digest
+        self.condition = threading.Condition()
+        self.thread = None
+        self.closed = False
+
+    def start(self):
+        with self.condition:
+            if self.thread is None:
+                self.thread = threading.Thread(target=self._run, name="notification-coalescer", daemon=True)
+                self.thread.start()
+
+    def add(self, to_email, name, sections) -> Future:
+        """
+        Queue rendered html sections for a recipient
+        """
+        self.start()
+        future = Future()
+        ready = None
+        with self.condition:
+            if self.closed:
+                raise RuntimeError("Notification coalescer is closed")
+            digest = self.pending.get(to_email)
+            if digest is None:
+                digest = self.pending[to_email] = _Digest(name, time.monotonic() + self.window)
+                self.condition.notify()
+            digest.sections.extend(sections)
+            digest.futures.append(future)
+            if len(digest.sections) >= self.max_size or self.window <= 0:
+                ready = self.pending.pop(to_email)
+        if ready is not None:
+            self._send(to_email, ready)
+        return future
+
+    def close(self):
+        """
+        Send everything still waiting and stop the flusher
+        """
+        with self.condition:
+            self.closed = True
+            due, self.pending = self.pending, {}
+            self.condition.notify()
+        for to_email, digest in due.items():
+            self._send(to_email, digest)
+
+    def _run(self):
+        while True:
+            with self.condition:
+                while not self.closed:
+                    now = time.monotonic()
+                    due = {email: digest for email, digest in self.pending.items() if digest.deadline <= now}
+                    if due:
+                        for email in due:
+                            del self.pending[email]
+                        break
+                    next_deadline = min((digest.deadline for digest in self.pending.values()), default=None)
+                    self.condition.wait(None if next_deadline is None else next_deadline - now)
+                else:
+                    return
+            for to_email, digest in due.items():
+                self._send(to_email, digest)
+
+    def _send(self, to_email, digest):
+        try:
+            subject, html = self.render(digest.name, digest.sections)
+            sent = self.send(to_email, subject, html)
+        except Exception as e:
+            logger.error(f"Failed to send digest to {to_email}: {str(e)}")
+            for future in digest.futures:
+                future.set_exception(e)
+            return
+
+        NOTIFICATIONS_COALESCED.inc(len(digest.sections))
+        DIGEST_EMAILS_SENT.inc()
+        logger.info(f"Sending digest of {len(digest.sections)} notifications to {to_email}")
+
+        def resolve(done):
+            error = done.exception()
+            for future in digest.futures:
+                if error is None:
+                    future.set_result(True)
+                else:
+                    future.set_exception(error)
+
+        sent.add_done_callback(resolve)
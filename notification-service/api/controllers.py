@@ -1,6 +1,10 @@
-from fastapi import APIRouter, Depends, HTTPException, Header
-from api.schema import EmailNotificationRequest, EmailNotificationResponse
+from fastapi import APIRouter, Depends, HTTPException, Header, Query
+from starlette.concurrency import run_in_threadpool
+from api.schema import EmailNotificationRequest, EmailNotificationResponse, DeadLetterMessage, DeadLetterReplayResponse
+from api.service_auth import verify_service_token
 from api import services
+from typing import List
+import rabbitmq_consumer
 
 router = APIRouter()
 
@@ -14,4 +18,22 @@ async def send_email_notification(notification: EmailNotificationRequest,
         raise HTTPException(status_code=401, detail="Bearer token missing or Invalid.")
     
     bearer_token = authorization.split(' ')[1]
-    return services.send_email_notification(notification, bearer_token)
\ No newline at end of file
+    return await services.send_email_notification(notification, bearer_token)
+
+# Dead-letter tooling is internal: it needs the service credential and is not exposed through nginx
+@router.get("/notification/dlq", response_model=List[DeadLetterMessage], dependencies=[Depends(verify_service_token)])
+async def get_dead_letters(limit: int = Query(50, ge=1, le=500)):
+    """
+    Inspect messages parked in the payment_events dead-letter queue
+    """
+    return await run_in_threadpool(rabbitmq_consumer.peek_dead_letters, limit)
+
+@router.post(
+    "/notification/dlq/replay", response_model=DeadLetterReplayResponse, dependencies=[Depends(verify_service_token)]
+)
+async def replay_dead_letters(limit: int = Query(50, ge=1, le=500)):
+    """
+    Move dead-lettered messages back onto payment_events with a fresh retry budget
+    """
+    replayed = await run_in_threadpool(rabbitmq_consumer.replay_dead_letters, limit)
+    return DeadLetterReplayResponse(replayed=replayed)
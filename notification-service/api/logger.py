@@ -1,11 +1,28 @@
+import atexit
 import logging
+import logging.handlers
+import queue
 import socket
+import threading
+import time
 import os
 
+from prometheus_client import Counter
+
 # Get environment variables for Logstash connection
 LOGSTASH_HOST = os.getenv("LOGSTASH_HOST", "localhost")
 LOGSTASH_PORT = int(os.getenv("LOGSTASH_PORT", 5044))
 
+# Shipping settings; records past the queue size are dropped rather than blocking the caller
+LOGSTASH_QUEUE_SIZE = int(os.getenv("LOGSTASH_QUEUE_SIZE", 10000))
+LOGSTASH_BATCH_SIZE = int(os.getenv("LOGSTASH_BATCH_SIZE", 200))
+LOGSTASH_FLUSH_INTERVAL = float(os.getenv("LOGSTASH_FLUSH_INTERVAL", 1.0))
+LOGSTASH_CONNECT_TIMEOUT = float(os.getenv("LOGSTASH_CONNECT_TIMEOUT", 2.0))
+LOGSTASH_RECONNECT_MAX_DELAY = float(os.getenv("LOGSTASH_RECONNECT_MAX_DELAY", 30.0))
+
+LOGSTASH_RECORDS_SENT = Counter("logstash_records_sent_total", "Log records delivered to Logstash")
+LOGSTASH_RECORDS_DROPPED = Counter("logstash_records_dropped_total", "Log records dropped before reaching Logstash", ["reason"])
+
 # Configure basic logging
 logging.basicConfig(
     level=logging.DEBUG,
@@ -15,55 +32,124 @@ logging.basicConfig(
 # Create logger
 logger = logging.getLogger("notification-service")
 
-# Simple text-based TCP handler for Logstash
-class SimpleTcpHandler(logging.Handler):
-    def __init__(self, host, port):
-        super().__init__()
+# Non-blocking handler: formats the record and hands it to the shipper queue.
+# When the queue is full the newest record is dropped and counted.
+class DroppingQueueHandler(logging.handlers.QueueHandler):
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            LOGSTASH_RECORDS_DROPPED.labels("queue_full").inc()
+
+# Background shipper (QueueListener style): drains the queue in batches and
+# writes each batch to Logstash over one TCP connection. While Logstash is
+# down it reconnects with exponential backoff instead of on every record.
+class LogstashShipper:
+    _sentinel = None
+
+    def __init__(self, log_queue, host, port, batch_size, flush_interval):
+        self.queue = log_queue
         self.host = host
         self.port = port
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
         self.socket = None
-        self.connect()
-        
+        self.retry_at = 0.0
+        self.retry_delay = 0.5
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="logstash-shipper", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout=5.0):
+        # flush what is queued, then stop the thread
+        if self._thread is None:
+            return
+        try:
+            self.queue.put(self._sentinel, timeout=timeout)
+        except queue.Full:
+            pass
+        self._thread.join(timeout)
+        self._thread = None
+        self.close()
+
     def connect(self):
+        if time.monotonic() < self.retry_at:
+            return False
         try:
-            self.socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-            self.socket.connect((self.host, self.port))
-        except Exception:
+            self.socket = socket.create_connection((self.host, self.port), timeout=LOGSTASH_CONNECT_TIMEOUT)
+            self.retry_delay = 0.5
+            return True
+        except OSError:
             self.socket = None
-    
-    def emit(self, record):
-        if not self.socket:
+            self.retry_at = time.monotonic() + self.retry_delay
+            self.retry_delay = min(self.retry_delay * 2, LOGSTASH_RECONNECT_MAX_DELAY)
+            return False
+
+    def close(self):
+        if self.socket:
             try:
-                self.connect()
-            except Exception:
-                return
-                
-        if not self.socket:
+                self.socket.close()
+            except OSError:
+                pass
+            self.socket = None
+
+    def send(self, batch):
+        if not self.socket and not self.connect():
+            LOGSTASH_RECORDS_DROPPED.labels("unavailable").inc(len(batch))
             return
-            
+        payload = "".join(record.getMessage() + "\n" for record in batch).encode("utf-8")
         try:
-            # Format the log message
-            formatted_message = self.format(record) + '\n'
-            
-            # Send to Logstash
-            self.socket.sendall(formatted_message.encode('utf-8'))
-        except Exception:
-            self.socket = None  # Force reconnection next time
+            self.socket.sendall(payload)
+            LOGSTASH_RECORDS_SENT.inc(len(batch))
+        except OSError:
+            # the batch is lost with the connection; reconnect after a backoff
+            LOGSTASH_RECORDS_DROPPED.labels("send_failed").inc(len(batch))
+            self.close()
+            self.retry_at = time.monotonic() + self.retry_delay
+            self.retry_delay = min(self.retry_delay * 2, LOGSTASH_RECONNECT_MAX_DELAY)
+
+    def _run(self):
+        while True:
+            batch = []
+            stopping = False
+            deadline = time.monotonic() + self.flush_interval
+            while len(batch) < self.batch_size:
+                try:
+                    record = self.queue.get(timeout=max(deadline - time.monotonic(), 0))
+                except queue.Empty:
+                    break
+                if record is self._sentinel:
+                    stopping = True
+                    break
+                batch.append(record)
+            if batch:
+                self.send(batch)
+            if stopping:
+                return
 
 # Add Logstash handler if configured
 if LOGSTASH_HOST and LOGSTASH_PORT:
     try:
+        log_queue = queue.Queue(maxsize=LOGSTASH_QUEUE_SIZE)
+
         # Create the handler
-        tcp_handler = SimpleTcpHandler(LOGSTASH_HOST, LOGSTASH_PORT)
+        queue_handler = DroppingQueueHandler(log_queue)
         
         # Set a formatter
         formatter = logging.Formatter('%(asctime)s - %(levelname)s - %(name)s - %(message)s')
-        tcp_handler.setFormatter(formatter)
+        queue_handler.setFormatter(formatter)
+
+        # Ship in the background and flush on interpreter exit
+        shipper = LogstashShipper(log_queue, LOGSTASH_HOST, LOGSTASH_PORT, LOGSTASH_BATCH_SIZE, LOGSTASH_FLUSH_INTERVAL)
+        shipper.start()
+        atexit.register(shipper.stop)
         
         # Add to logger
-        logger.addHandler(tcp_handler)
+        logger.addHandler(queue_handler)
         
         # Test log
         logger.info("Logstash logging configured")
     except Exception as e:
-        logger.error(f"Failed to configure Logstash logging: {str(e)}")
\ No newline at end of file
+        logger.error(f"Failed to configure Logstash logging: {str(e)}")
@@ -24,4 +24,12 @@ class EmailNotificationResponse(BaseModel):
     message: str
     
     class Config:
-        from_attributes = True
\ No newline at end of file
+        from_attributes = True
+
+class DeadLetterMessage(BaseModel):
+    retry_count: int
+    reason: Optional[str] = None
+    message: Any
+
+class DeadLetterReplayResponse(BaseModel):
+    replayed: int
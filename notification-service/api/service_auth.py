@@ -0,0 +1,29 @@
+import hmac
+import os
+
+from fastapi import Header, HTTPException
+
+from api.logger import logger
+
+# Shared credential for internal routes (service-to-service calls and operator tooling),
+# sent in the X-Service-Token header. When it is not configured those routes refuse every caller.
+SERVICE_AUTH_TOKEN = os.getenv("SERVICE_AUTH_TOKEN", "")
+SERVICE_AUTH_HEADER = "X-Service-Token"
+
+
+def verify_service_token(x_service_token: str = Header(None)):
+    """
+    FastAPI dependency that only lets callers holding the shared service credential through
+    """
+    if not SERVICE_AUTH_TOKEN:
+        logger.error("SERVICE_AUTH_TOKEN is not configured, rejecting internal request")
+        raise HTTPException(status_code=503, detail="Service authentication is not configured.")
+    if x_service_token is None or not hmac.compare_digest(x_service_token, SERVICE_AUTH_TOKEN):
+        raise HTTPException(status_code=403, detail="Service credential missing or invalid.")
+
+
+def service_auth_headers():
+    """
+    Headers that authenticate this service when calling another service's internal routes
+    """
+    return {SERVICE_AUTH_HEADER: SERVICE_AUTH_TOKEN}
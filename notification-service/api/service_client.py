@@ -0,0 +1,198 @@
+import asyncio
+import os
+import random
+import threading
+import time
+
+import httpx
+from prometheus_client import Histogram
+
+from api.logger import logger
+
+# Inter-service calls go through the nginx gateway
+NGINX_HOST = os.getenv("NGINX_HOST", "localhost")
+
+HTTP_TIMEOUT = float(os.getenv("HTTP_CLIENT_TIMEOUT", 5))
+HTTP_RETRIES = int(os.getenv("HTTP_CLIENT_RETRIES", 2))
+HTTP_BACKOFF = float(os.getenv("HTTP_CLIENT_BACKOFF", 0.1))  # base delay, doubled per attempt and jittered
+HTTP_MAX_CONNECTIONS = int(os.getenv("HTTP_CLIENT_MAX_CONNECTIONS", 100))
+HTTP_MAX_KEEPALIVE = int(os.getenv("HTTP_CLIENT_MAX_KEEPALIVE", 20))
+BREAKER_FAILURE_THRESHOLD = int(os.getenv("CIRCUIT_BREAKER_FAILURES", 5))
+BREAKER_RESET_SECONDS = float(os.getenv("CIRCUIT_BREAKER_RESET_SECONDS", 30))
+
+RETRYABLE_STATUS_CODES = {502, 503, 504}
+IDEMPOTENT_METHODS = {"GET", "HEAD", "OPTIONS"}
+
+UPSTREAM_LATENCY = Histogram(
+    "upstream_request_duration_seconds",
+    "Latency of calls to other services, per attempt",
+    ["upstream", "outcome"],
+)
+
+
+class CircuitOpenError(Exception):
+    pass
+
+
+class CircuitBreaker:
+    """
+    Opens after `failure_threshold` consecutive failures and rejects calls
+    until `reset_seconds` have passed, then lets a single trial call through.
+    """
+
+    def __init__(self, failure_threshold=BREAKER_FAILURE_THRESHOLD, reset_seconds=BREAKER_RESET_SECONDS):
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self.failures = 0
+        self.opened_at = None
+        self.trial_in_flight = False
+        self.lock = threading.Lock()
+
+    def allow(self):
+        with self.lock:
+            if self.opened_at is None:
+                return True
+            if time.monotonic() - self.opened_at < self.reset_seconds or self.trial_in_flight:
+                return False
+            self.trial_in_flight = True
+            return True
+
+    def record_success(self):
+        with self.lock:
+            self.failures = 0
+            self.opened_at = None
+            self.trial_in_flight = False
+
+    def record_failure(self):
+        with self.lock:
+            self.failures += 1
+            self.trial_in_flight = False
+            if self.opened_at is not None or self.failures >= self.failure_threshold:
+                self.opened_at = time.monotonic()
+
+
+class ServiceClient:
+    """
+    Pooled keep-alive HTTP client for one upstream, with per-call timeouts,
+    jittered retries for idempotent requests and a circuit breaker.
+    The async client serves request handlers; the sync twin serves worker threads.
+    """
+
+    def __init__(self, upstream, base_url, timeout=HTTP_TIMEOUT, retries=HTTP_RETRIES):
+        self.upstream = upstream
+        self.base_url = base_url
+        self.timeout = timeout
+        self.retries = retries
+        self.breaker = CircuitBreaker()
+        self.limits = httpx.Limits(max_connections=HTTP_MAX_CONNECTIONS, max_keepalive_connections=HTTP_MAX_KEEPALIVE)
+        self._async_client = None
+        self._sync_client = None
+        self._lock = threading.Lock()
+
+    @property
+    def async_client(self):
+        if self._async_client is None:
+            self._async_client = httpx.AsyncClient(base_url=self.base_url, timeout=self.timeout, limits=self.limits)
+        return self._async_client
+
+    @property
+    def sync_client(self):
+        with self._lock:
+            if self._sync_client is None:
+                self._sync_client = httpx.Client(base_url=self.base_url, timeout=self.timeout, limits=self.limits)
+            return self._sync_client
+
+    def _attempts(self, method, retries):
+        if retries is None:
+            retries = self.retries if method.upper() in IDEMPOTENT_METHODS else 0
+        return retries + 1
+
+    def _backoff(self, attempt):
+        # Full jitter: anywhere between 0 and base * 2^attempt
+        return random.uniform(0, HTTP_BACKOFF * (2 ** attempt))
+
+    def _before_attempt(self, path):
+        if not self.breaker.allow():
+            UPSTREAM_LATENCY.labels(self.upstream, "circuit_open").observe(0)
+            raise CircuitOpenError(f"Circuit open for {self.upstream}, not calling {path}")
+
+    def _after_attempt(self, start, response=None, error=None):
+        duration = time.perf_counter() - start
+        if error is not None or response.status_code >= 500:
+            self.breaker.record_failure()
+            outcome = "error" if error is not None else str(response.status_code)
+        else:
+            self.breaker.record_success()
+            outcome = str(response.status_code)
+        UPSTREAM_LATENCY.labels(self.upstream, outcome).observe(duration)
+
+    def _should_retry(self, attempt, attempts, response=None):
+        if attempt + 1 >= attempts:
+            return False
+        return response is None or response.status_code in RETRYABLE_STATUS_CODES
+
+    async def request(self, method, path, timeout=None, retries=None, **kwargs) -> httpx.Response:
+        attempts = self._attempts(method, retries)
+        for attempt in range(attempts):
+            self._before_attempt(path)
+            start = time.perf_counter()
+            try:
+                response = await self.async_client.request(method, path, timeout=timeout or self.timeout, **kwargs)
+            except httpx.TransportError as e:
+                self._after_attempt(start, error=e)
+                if not self._should_retry(attempt, attempts):
+                    raise
+                logger.warning(f"{self.upstream} {method} {path} failed ({e}), retrying")
+            else:
+                self._after_attempt(start, response=response)
+                if not self._should_retry(attempt, attempts, response):
+                    return response
+                logger.warning(f"{self.upstream} {method} {path} returned {response.status_code}, retrying")
+            await asyncio.sleep(self._backoff(attempt))
+
+    def request_sync(self, method, path, timeout=None, retries=None, **kwargs) -> httpx.Response:
+        attempts = self._attempts(method, retries)
+        for attempt in range(attempts):
+            self._before_attempt(path)
+            start = time.perf_counter()
+            try:
+                response = self.sync_client.request(method, path, timeout=timeout or self.timeout, **kwargs)
+            except httpx.TransportError as e:
+                self._after_attempt(start, error=e)
+                if not self._should_retry(attempt, attempts):
+                    raise
+                logger.warning(f"{self.upstream} {method} {path} failed ({e}), retrying")
+            else:
+                self._after_attempt(start, response=response)
+                if not self._should_retry(attempt, attempts, response):
+                    return response
+                logger.warning(f"{self.upstream} {method} {path} returned {response.status_code}, retrying")
+            time.sleep(self._backoff(attempt))
+
+    async def get_json(self, path, **kwargs):
+        response = await self.request("GET", path, **kwargs)
+        response.raise_for_status()
+        return response.json()
+
+    def get_json_sync(self, path, **kwargs):
+        response = self.request_sync("GET", path, **kwargs)
+        response.raise_for_status()
+        return response.json()
+
+    async def aclose(self):
+        if self._async_client is not None:
+            await self._async_client.aclose()
+            self._async_client = None
+        if self._sync_client is not None:
+            self._sync_client.close()
+            self._sync_client = None
+
+
+# Shared clients, one per upstream
+auth_client = ServiceClient("auth-service", f"http://{NGINX_HOST}")
+train_client = ServiceClient("train-service", f"http://{NGINX_HOST}")
+
+
+async def close_service_clients():
+    await auth_client.aclose()
+    await train_client.aclose()
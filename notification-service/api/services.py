@@ -1,89 +1,48 @@
 from fastapi import HTTPException
 from api.logger import logger
-from api.schema import EmailNotificationRequest, EmailNotificationResponse, NotificationType
+from api.schema import EmailNotificationRequest, EmailNotificationResponse
+from api.token_verifier import verify_token
+from api.smtp_pool import SMTPConnectionPool, EmailDispatcher
+from api.coalescer import NotificationCoalescer
+from api.service_client import auth_client, train_client
+from api.service_auth import service_auth_headers
+from api.cache import ticket_cache, user_cache
+from api.templates import template_registry, TemplateError, MissingTemplateDataError
+from starlette.concurrency import run_in_threadpool
+from concurrent.futures import Future
 import os
-import requests
 import uuid
-import smtplib
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
 
-# For sync calls to auth service
-NGINX_HOST = os.getenv("NGINX_HOST", "localhost")
-
 # Email configuration
 SMTP_SERVER = os.getenv("SMTP_SERVER", "localhost")
 SMTP_PORT = int(os.getenv("SMTP_PORT", 25))
 SMTP_USERNAME = os.getenv("SMTP_USERNAME", "")
 SMTP_PASSWORD = os.getenv("SMTP_PASSWORD", "")
 FROM_EMAIL = os.getenv("FROM_EMAIL", "noreply@trainbooking.com")
+SMTP_MAX_CONNECTIONS = int(os.getenv("SMTP_MAX_CONNECTIONS", 4))
+SMTP_IDLE_TIMEOUT = float(os.getenv("SMTP_IDLE_TIMEOUT", 60))
+SMTP_BATCH_SIZE = int(os.getenv("SMTP_BATCH_SIZE", 20))
+SMTP_SEND_TIMEOUT = float(os.getenv("SMTP_SEND_TIMEOUT", 60))
+# Payment/booking confirmations for one recipient within the window go out as one digest
+COALESCE_WINDOW_SECONDS = float(os.getenv("NOTIFICATION_COALESCE_WINDOW_SECONDS", 1.0))
+COALESCE_MAX_SECTIONS = int(os.getenv("NOTIFICATION_COALESCE_MAX_SECTIONS", 20))
 
-# Templates
-EMAIL_TEMPLATES = {
-    NotificationType.OTP: """
-    <html>
-    <body>
-        <h1>Train Booking OTP</h1>
-        <p>Hello,</p>
-        <p>Your OTP for verification is: <strong>{otp}</strong></p>
-        <p>This OTP will expire in 10 minutes.</p>
-        <p>Thank you,<br>Train Booking Team</p>
-    </body>
-    </html>
-    """,
-    NotificationType.BOOKING_CONFIRMATION: """
-    <html>
-    <body>
-        <h1>Booking Confirmation</h1>
-        <p>Hello {name},</p>
-        <p>Your booking has been confirmed!</p>
-        <p><strong>Booking Details:</strong></p>
-        <ul>
-            <li>Train: {train_name}</li>
-            <li>From: {source}</li>
-            <li>To: {destination}</li>
-            <li>Date: {date}</li>
-            <li>Seat: {seat}</li>
-            <li>Ticket ID: {ticket_id}</li>
-        </ul>
-        <p>Thank you for choosing our service!</p>
-        <p>Regards,<br>Train Booking Team</p>
-    </body>
-    </html>
-    """,
-    NotificationType.PAYMENT_CONFIRMATION: """
-    <html>
-    <body>
-        <h1>Payment Confirmation</h1>
-        <p>Hello {name},</p>
-        <p>Your payment of {amount} {currency} has been confirmed!</p>
-        <p><strong>Payment Details:</strong></p>
-        <ul>
-            <li>Payment ID: {payment_id}</li>
-            <li>Transaction ID: {transaction_id}</li>
-            <li>Amount: {amount} {currency}</li>
-            <li>Ticket ID: {ticket_id}</li>
-        </ul>
-        <p>Thank you for your payment!</p>
-        <p>Regards,<br>Train Booking Team</p>
-    </body>
-    </html>
-    """,
-    NotificationType.GENERAL: """
-    <html>
-    <body>
-        <h1>{subject}</h1>
-        <p>Hello {name},</p>
-        <p>{message}</p>
-        <p>Regards,<br>Train Booking Team</p>
-    </body>
-    </html>
-    """
-}
+# Shared SMTP sessions; one dispatcher worker per pooled connection
+smtp_pool = SMTPConnectionPool(
+    SMTP_SERVER,
+    SMTP_PORT,
+    username=SMTP_USERNAME,
+    password=SMTP_PASSWORD,
+    max_connections=SMTP_MAX_CONNECTIONS,
+    idle_timeout=SMTP_IDLE_TIMEOUT
+)
+email_dispatcher = EmailDispatcher(smtp_pool, workers=SMTP_MAX_CONNECTIONS, batch_size=SMTP_BATCH_SIZE)
 
-def send_email(to_email, subject, html_content):
+def submit_email(to_email, subject, html_content) -> Future:
     """
-    Send an email using SMTP
+    Queue an email without waiting; the future resolves once the SMTP server accepts it
     """
     # In production, use a proper email service provider like SendGrid, Mailgun, etc.
     # This is a basic implementation for demonstration
@@ -91,22 +50,39 @@ def send_email(to_email, subject, html_content):
     # Mock email sending in development
     if os.getenv("ENVIRONMENT", "development") == "development":
         logger.info(f"MOCK: Email would be sent to {to_email} with subject '{subject}'")
-        message_id = str(uuid.uuid4())
-        return message_id
-        
+        future = Future()
+        future.set_result(True)
+        return future
+    
+    msg = MIMEMultipart()
+    msg['From'] = FROM_EMAIL
+    msg['To'] = to_email
+    msg['Subject'] = subject
+    
+    msg.attach(MIMEText(html_content, 'html'))
+    
+    # Sent over a pooled session, batched with other queued emails
+    return email_dispatcher.submit(msg)
+
+def render_digest(name, sections):
+    subject = "Booking Confirmation - Train Booking"
+    html = template_registry.get("booking_digest").render({"name": name, "sections": "".join(sections)})
+    return subject, html
+
+# Merges per-event confirmation sections into one email per recipient
+notification_coalescer = NotificationCoalescer(
+    submit_email,
+    render_digest,
+    window=COALESCE_WINDOW_SECONDS,
+    max_size=COALESCE_MAX_SECTIONS
+)
+
+def send_email(to_email, subject, html_content):
+    """
+    Send an email using SMTP
+    """
     try:
-        msg = MIMEMultipart()
-        msg['From'] = FROM_EMAIL
-        msg['To'] = to_email
-        msg['Subject'] = subject
-        
-        msg.attach(MIMEText(html_content, 'html'))
-        
-        with smtplib.SMTP(SMTP_SERVER, SMTP_PORT) as server:
-            if SMTP_USERNAME and SMTP_PASSWORD:
-                server.starttls()
-                server.login(SMTP_USERNAME, SMTP_PASSWORD)
-            server.send_message(msg)
+        submit_email(to_email, subject, html_content).result(timeout=SMTP_SEND_TIMEOUT)
 
         message_id = str(uuid.uuid4())
         logger.info(f"Email sent to {to_email} with subject '{subject}'")
@@ -115,38 +91,30 @@ def send_email(to_email, subject, html_content):
         logger.error(f"Failed to send email: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Failed to send email: {str(e)}")
 
-def send_email_notification(notification: EmailNotificationRequest, bearer_token: str):
+async def send_email_notification(notification: EmailNotificationRequest, bearer_token: str):
     """
     Send an email notification based on the request data
     """
     # Verify the user's identity
-    try:
-        endpoint = f"http://{NGINX_HOST}/verify-token"
-        headers = {"Authorization": f"Bearer {bearer_token}"}
-        response = requests.get(endpoint, headers=headers)
-        response.raise_for_status()
-        # We can get user info if needed
-        # user_data = response.json()
-    except Exception as e:
-        logger.error(f"Error verifying token: {e}")
-        raise HTTPException(status_code=500, detail="Internal server error while verifying token with auth service")
+    # We can get user info from the claims if needed
+    await verify_token(bearer_token)
     
-    # Get template based on notification type
-    template = EMAIL_TEMPLATES.get(notification.notification_type)
-    if not template:
-        logger.error(f"No template found for notification type: {notification.notification_type}")
-        raise HTTPException(status_code=400, detail=f"No template found for notification type: {notification.notification_type}")
+    # Pick the compiled template (template_id may pin a version, e.g. "general@v2")
+    try:
+        template = template_registry.resolve(notification.notification_type, notification.template_id)
+    except TemplateError as e:
+        logger.error(str(e))
+        raise HTTPException(status_code=400, detail=str(e))
     
-    # Format template with provided data
-    template_data = notification.template_data or {}
+    # Render with the provided data; required keys are checked before rendering
     try:
-        html_content = template.format(**template_data)
-    except KeyError as e:
-        logger.error(f"Missing template data: {e}")
-        raise HTTPException(status_code=400, detail=f"Missing template data: {str(e)}")
+        html_content = template.render(notification.template_data or {})
+    except MissingTemplateDataError as e:
+        logger.error(str(e))
+        raise HTTPException(status_code=400, detail=f"Missing template data: {', '.join(e.missing)}")
     
     # Send email
-    message_id = send_email(notification.to_email, notification.subject, html_content)
+    message_id = await run_in_threadpool(send_email, notification.to_email, notification.subject, html_content)
     
     # Return response
     return EmailNotificationResponse(
@@ -155,10 +123,73 @@ def send_email_notification(notification: EmailNotificationRequest, bearer_token
         message=f"Email notification of type {notification.notification_type} sent to {notification.to_email}"
     )
 
-def process_payment_completed_event(event_data):
+def fetch_missing(cache, keys, fetch):
     """
-    Process payment completed event from RabbitMQ
+    Resolve keys from the local cache, fetching all misses with one upstream call
     """
+    found = {}
+    missing = []
+    for key in keys:
+        value = cache.get(key)
+        if value is None:
+            missing.append(key)
+        else:
+            found[key] = value
+    if missing:
+        for key, value in fetch(missing).items():
+            cache.set(key, value)
+            found[key] = value
+    return found
+
+def fetch_ticket_details(ticket_ids):
+    response = train_client.request_sync(
+        "POST",
+        "/ticket/details",
+        json={"ticket_ids": ticket_ids},
+        headers=service_auth_headers(),
+        retries=train_client.retries,
+    )
+    response.raise_for_status()
+    return {details["ticket_id"]: details for details in response.json()}
+
+def fetch_users(user_ids):
+    response = auth_client.request_sync(
+        "POST", "/users/batch", json={"ids": user_ids}, headers=service_auth_headers(), retries=auth_client.retries
+    )
+    response.raise_for_status()
+    return {user["id"]: user for user in response.json()}
+
+def enrich_payment_events(events):
+    """
+    Look up ticket/train and user details for a batch of payment events,
+    with at most one call per upstream. Returns (tickets by id, users by id);
+    whatever could not be fetched is simply absent.
+    """
+    ticket_ids = sorted({event.get("ticket_id") for event in events if event.get("ticket_id") is not None})
+    user_ids = sorted({event.get("user_id") for event in events if event.get("user_id") is not None})
+
+    tickets = {}
+    users = {}
+    try:
+        tickets = fetch_missing(ticket_cache, ticket_ids, fetch_ticket_details)
+    except Exception as e:
+        logger.error(f"Error fetching ticket details: {e}")
+    try:
+        users = fetch_missing(user_cache, user_ids, fetch_users)
+    except Exception as e:
+        logger.error(f"Error fetching user details: {e}")
+    return tickets, users
+
+def process_payment_completed_event(event_data, tickets=None, users=None) -> Future:
+    """
+    Process payment completed event from RabbitMQ. Batched consumers pass in
+    details already looked up with enrich_payment_events.
+    The payment and booking confirmations are queued on the coalescer; the
+    returned future resolves to True once the digest carrying them is sent.
+    """
+    failed = Future()
+    failed.set_result(False)
+
     logger.info(f"Processing payment completed event: {event_data}")
     
     try:
@@ -169,87 +200,42 @@ def process_payment_completed_event(event_data):
         amount = event_data.get("amount")
         transaction_id = event_data.get("transaction_id")
         
-        # Get ticket and user details
-        # In a real implementation, we would call the auth and train services
-        # to get these details
-        
-        # For now, let's mock this part
-        user_email = "user@example.com"  # In production, get this from auth service
-        user_name = "User"  # In production, get this from auth service
-        
-        # Get ticket details
-        try:
-            endpoint = f"http://{NGINX_HOST}/ticket/{ticket_id}"
-            response = requests.get(endpoint)
-            response.raise_for_status()
-            ticket_data = response.json()
-            
-            # Get train details
-            train_endpoint = f"http://{NGINX_HOST}/train/{ticket_data.get('train_id')}"
-            train_response = requests.get(train_endpoint)
-            train_response.raise_for_status()
-            train_data = train_response.json()
-        except Exception as e:
-            logger.error(f"Error fetching ticket/train details: {e}")
-            # Continue with mock data
-            ticket_data = {
-                "id": ticket_id,
-                "seat_number": "A1",
-                "train_id": 1
-            }
-            train_data = {
-                "id": 1,
-                "name": "Express Train",
-                "source": "Source City",
-                "destination": "Destination City",
-                "departure_time": "2023-04-10T10:00:00"
-            }
-        
-        # Send payment confirmation email
-        notification = EmailNotificationRequest(
-            to_email=user_email,
-            subject="Payment Confirmation - Train Booking",
-            notification_type=NotificationType.PAYMENT_CONFIRMATION,
-            template_data={
-                "name": user_name,
-                "payment_id": payment_id,
-                "transaction_id": transaction_id,
-                "amount": amount,
-                "currency": "INR",
-                "ticket_id": ticket_id
-            }
-        )
-        
-        # Send booking confirmation email
-        booking_notification = EmailNotificationRequest(
-            to_email=user_email,
-            subject="Booking Confirmation - Train Booking",
-            notification_type=NotificationType.BOOKING_CONFIRMATION,
-            template_data={
-                "name": user_name,
-                "train_name": train_data.get("name"),
-                "source": train_data.get("source"),
-                "destination": train_data.get("destination"),
-                "date": train_data.get("departure_time"),
-                "seat": ticket_data.get("seat_number"),
-                "ticket_id": ticket_id
-            }
-        )
+        if tickets is None or users is None:
+            tickets, users = enrich_payment_events([event_data])
         
-        # In production, we would actually send these emails
-        # For now, we'll just log it
-        logger.info(f"Would send payment confirmation email to {user_email}")
-        logger.info(f"Would send booking confirmation email to {user_email}")
+        # Without the details the emails can't be written; returning False retries the event later
+        ticket_data = tickets.get(ticket_id)
+        user = users.get(user_id)
+        if ticket_data is None or user is None:
+            logger.error(f"Missing ticket or user details for payment {payment_id}")
+            return failed
+        train_data = ticket_data["train"]
+        user_email = user["email"]
+        user_name = user["username"]
         
-        # Mock sending
-        send_email(notification.to_email, notification.subject, 
-                   EMAIL_TEMPLATES[notification.notification_type].format(**notification.template_data))
+        # Render each section once from the compiled templates
+        payment_html = template_registry.get("payment_confirmation_section").render({
+            "name": user_name,
+            "payment_id": payment_id,
+            "transaction_id": transaction_id,
+            "amount": amount,
+            "currency": "INR",
+            "ticket_id": ticket_id
+        })
+        booking_html = template_registry.get("booking_confirmation_section").render({
+            "name": user_name,
+            "train_name": train_data.get("name"),
+            "source": train_data.get("source"),
+            "destination": train_data.get("destination"),
+            "date": train_data.get("departure_time"),
+            "seat": ticket_data.get("seat_number"),
+            "ticket_id": ticket_id
+        })
         
-        send_email(booking_notification.to_email, booking_notification.subject,
-                  EMAIL_TEMPLATES[booking_notification.notification_type].format(**booking_notification.template_data))
+        sent = notification_coalescer.add(user_email, user_name, [payment_html, booking_html])
         
-        logger.info(f"Processed payment completed event for payment {payment_id}")
-        return True
+        logger.info(f"Queued confirmations for payment {payment_id}")
+        return sent
     except Exception as e:
         logger.error(f"Error processing payment completed event: {e}")
-        return False
\ No newline at end of file
+        return failed
@@ -0,0 +1,160 @@
+import queue
+import smtplib
+import threading
+import time
+from concurrent.futures import Future
+from contextlib import contextmanager
+
+from api.logger import logger
+
+
+class SMTPConnectionPool:
+    """
+    Keeps authenticated SMTP sessions open for reuse instead of doing
+    connect + STARTTLS + login for every message.
+    """
+
+    def __init__(self, host, port, username="", password="", max_connections=4, idle_timeout=60):
+        self.host = host
+        self.port = port
+        self.username = username
+        self.password = password
+        self.idle_timeout = idle_timeout
+        self._idle = queue.LifoQueue()  # (server, last_used)
+        self._slots = threading.BoundedSemaphore(max_connections)
+
+    def _connect(self):
+        server = smtplib.SMTP(self.host, self.port, timeout=30)
+        if self.username and self.password:
+            server.starttls()
+            server.login(self.username, self.password)
+        logger.info(f"Opened SMTP session to {self.host}:{self.port}")
+        return server
+
+    def _is_alive(self, server, last_used):
+        if time.monotonic() - last_used > self.idle_timeout:
+            return False
+        try:
+            return server.noop()[0] == 250
+        except smtplib.SMTPException:
+            return False
+        except OSError:
+            return False
+
+    def _close(self, server):
+        try:
+            server.quit()
+        except Exception:
+            server.close()
+
+    def acquire(self):
+        self._slots.acquire()
+        try:
+            while True:
+                try:
+                    server, last_used = self._idle.get_nowait()
+                except queue.Empty:
+                    return self._connect()
+                if self._is_alive(server, last_used):
+                    return server
+                self._close(server)
+        except Exception:
+            self._slots.release()
+            raise
+
+    def release(self, server, broken=False):
+        if broken:
+            self._close(server)
+        else:
+            self._idle.put((server, time.monotonic()))
+        self._slots.release()
+
+    @contextmanager
+    def connection(self):
+        server = self.acquire()
+        broken = False
+        try:
+            yield server
+        except (smtplib.SMTPServerDisconnected, OSError):
+            broken = True
+            raise
+        finally:
+            self.release(server, broken=broken)
+
+    def close(self):
+        while True:
+            try:
+                server, _ = self._idle.get_nowait()
+            except queue.Empty:
+                return
+            self._close(server)
+
+
+class EmailDispatcher:
+    """
+    Sends queued messages in batches over pooled SMTP sessions.
+    Each worker drains up to batch_size messages and sends them on one session,
+    so concurrency is bounded by the number of workers.
+    """
+
+    def __init__(self, pool, workers=4, batch_size=20, max_attempts=2):
+        self.pool = pool
+        self.workers = workers
+        self.batch_size = batch_size
+        self.max_attempts = max_attempts
+        self.outbox = queue.Queue()
+        self.threads = []
+        self.lock = threading.Lock()
+
+    def start(self):
+        with self.lock:
+            if self.threads:
+                return
+            for index in range(self.workers):
+                thread = threading.Thread(target=self._run, name=f"email-dispatcher-{index}", daemon=True)
+                thread.start()
+                self.threads.append(thread)
+
+    def submit(self, message) -> Future:
+        """
+        Queue an email.message for delivery; the future resolves once the server accepts it
+        """
+        self.start()
+        future = Future()
+        self.outbox.put((message, future, 1))
+        return future
+
+    def _next_batch(self):
+        batch = [self.outbox.get()]
+        while len(batch) < self.batch_size:
+            try:
+                batch.append(self.outbox.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._next_batch()
+            try:
+                self._send_batch(batch)
+            except Exception as e:
+                # Session failed (connect, login or mid-batch disconnect): retry what was not sent
+                logger.error(f"SMTP session failed: {str(e)}")
+                for message, future, attempt in batch:
+                    if future.done():
+                        continue
+                    if attempt < self.max_attempts:
+                        self.outbox.put((message, future, attempt + 1))
+                    else:
+                        future.set_exception(e)
+
+    def _send_batch(self, batch):
+        with self.pool.connection() as server:
+            for message, future, attempt in batch:
+                try:
+                    server.send_message(message)
+                    future.set_result(True)
+                except (smtplib.SMTPRecipientsRefused, smtplib.SMTPSenderRefused, smtplib.SMTPDataError) as e:
+                    # Message level failure, the session is still usable
+                    future.set_exception(e)
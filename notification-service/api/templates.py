@@ -0,0 +1,215 @@
+import string
+import threading
+
+from api.schema import NotificationType
+
+
+class TemplateError(Exception):
+    pass
+
+
+class UnknownTemplateError(TemplateError):
+    pass
+
+
+class MissingTemplateDataError(TemplateError):
+    def __init__(self, template_key, missing):
+        self.missing = sorted(missing)
+        super().__init__(f"Missing template data for {template_key}: {', '.join(self.missing)}")
+
+
+class CompiledTemplate:
+    """
+    A str.format-style template parsed once into static chunks and field
+    lookups, so rendering is a single join with no re-parsing. The set of
+    required keys is known up front and checked before rendering.
+    """
+
+    _formatter = string.Formatter()
+
+    def __init__(self, template_id, version, source):
+        self.template_id = template_id
+        self.version = version
+        self.key = f"{template_id}@v{version}"
+        self.source = source
+        self.parts = []  # static strings and (field_name, root_key, conversion, format_spec) tuples
+        self.required_keys = set()
+
+        for literal, field_name, format_spec, conversion in self._formatter.parse(source):
+            if literal:
+                # adjacent static text is merged into one chunk
+                if self.parts and isinstance(self.parts[-1], str):
+                    self.parts[-1] += literal
+                else:
+                    self.parts.append(literal)
+            if field_name is None:
+                continue
+            if not field_name or field_name.isdigit():
+                raise TemplateError(f"Template {self.key} uses a positional field; only named fields are supported")
+            if format_spec and "{" in format_spec:
+                raise TemplateError(f"Template {self.key} uses a nested format spec in {field_name}")
+            root_key = field_name.split(".", 1)[0].split("[", 1)[0]
+            self.required_keys.add(root_key)
+            self.parts.append((field_name, root_key, conversion, format_spec or ""))
+
+    def validate(self, data):
+        missing = self.required_keys.difference(data)
+        if missing:
+            raise MissingTemplateDataError(self.key, missing)
+
+    def render(self, data):
+        self.validate(data)
+        chunks = []
+        for part in self.parts:
+            if isinstance(part, str):
+                chunks.append(part)
+                continue
+            field_name, root_key, conversion, format_spec = part
+            if field_name == root_key:
+                value = data[root_key]
+            else:
+                value = self._formatter.get_field(field_name, (), data)[0]
+            if conversion:
+                value = self._formatter.convert_field(value, conversion)
+            chunks.append(format(value, format_spec))
+        return "".join(chunks)
+
+
+class TemplateRegistry:
+    """
+    Compiled email templates keyed by template id, with numbered versions.
+    A template id may pin a version as "name@v2"; without it the latest version is used.
+    """
+
+    def __init__(self):
+        self._templates = {}  # template_id -> {version: CompiledTemplate}
+        self._lock = threading.Lock()
+
+    def register(self, template_id, source, version=1):
+        template = CompiledTemplate(template_id, version, source)
+        with self._lock:
+            self._templates.setdefault(template_id, {})[version] = template
+        return template
+
+    def get(self, template_id):
+        name, _, version = template_id.partition("@v")
+        versions = self._templates.get(name)
+        if not versions:
+            raise UnknownTemplateError(f"Unknown template: {template_id}")
+        if not version:
+            return versions[max(versions)]
+        if not version.isdigit() or int(version) not in versions:
+            raise UnknownTemplateError(f"Unknown template version: {template_id}")
+        return versions[int(version)]
+
+    def resolve(self, notification_type, template_id=None):
+        """
+        The template for an explicit template id, or the default one for the notification type
+        """
+        return self.get(template_id or NotificationType(notification_type).value)
+
+    def render(self, notification_type, data, template_id=None):
+        return self.resolve(notification_type, template_id).render(data)
+
+
+template_registry = TemplateRegistry()
+
+# Default templates, one per notification type (template id = notification type value)
+template_registry.register(NotificationType.OTP.value, """
+    <html>
+    <body>
+        <h1>Train Booking OTP</h1>
+        <p>Hello,</p>
+        <p>Your OTP for verification is: <strong>{otp}</strong></p>
+        <p>This OTP will expire in 10 minutes.</p>
+        <p>Thank you,<br>Train Booking Team</p>
+    </body>
+    </html>
+    """)
+
+template_registry.register(NotificationType.BOOKING_CONFIRMATION.value, """
+    <html>
+    <body>
+        <h1>Booking Confirmation</h1>
+        <p>Hello {name},</p>
+        <p>Your booking has been confirmed!</p>
+        <p><strong>Booking Details:</strong></p>
+        <ul>
+            <li>Train: {train_name}</li>
+            <li>From: {source}</li>
+            <li>To: {destination}</li>
+            <li>Date: {date}</li>
+            <li>Seat: {seat}</li>
+            <li>Ticket ID: {ticket_id}</li>
+        </ul>
+        <p>Thank you for choosing our service!</p>
+        <p>Regards,<br>Train Booking Team</p>
+    </body>
+    </html>
+    """)
+
+template_registry.register(NotificationType.PAYMENT_CONFIRMATION.value, """
+    <html>
+    <body>
+        <h1>Payment Confirmation</h1>
+        <p>Hello {name},</p>
+        <p>Your payment of {amount} {currency} has been confirmed!</p>
+        <p><strong>Payment Details:</strong></p>
+        <ul>
+            <li>Payment ID: {payment_id}</li>
+            <li>Transaction ID: {transaction_id}</li>
+            <li>Amount: {amount} {currency}</li>
+            <li>Ticket ID: {ticket_id}</li>
+        </ul>
+        <p>Thank you for your payment!</p>
+        <p>Regards,<br>Train Booking Team</p>
+    </body>
+    </html>
+    """)
+
+template_registry.register(NotificationType.GENERAL.value, """
+    <html>
+    <body>
+        <h1>{subject}</h1>
+        <p>Hello {name},</p>
+        <p>{message}</p>
+        <p>Regards,<br>Train Booking Team</p>
+    </body>
+    </html>
+    """)
+
+# Digest emails: per-event sections merged into one message per recipient
+template_registry.register("payment_confirmation_section", """
+        <h2>Payment Confirmation</h2>
+        <ul>
+            <li>Payment ID: {payment_id}</li>
+            <li>Transaction ID: {transaction_id}</li>
+            <li>Amount: {amount} {currency}</li>
+            <li>Ticket ID: {ticket_id}</li>
+        </ul>
+    """)
+
+template_registry.register("booking_confirmation_section", """
+        <h2>Booking Confirmation</h2>
+        <ul>
+            <li>Train: {train_name}</li>
+            <li>From: {source}</li>
+            <li>To: {destination}</li>
+            <li>Date: {date}</li>
+            <li>Seat: {seat}</li>
+            <li>Ticket ID: {ticket_id}</li>
+        </ul>
+    """)
+
+template_registry.register("booking_digest", """
+    <html>
+    <body>
+        <h1>Your Train Booking</h1>
+        <p>Hello {name},</p>
+        <p>Your payment and booking have been confirmed!</p>
+        {sections}
+        <p>Thank you for choosing our service!</p>
+        <p>Regards,<br>Train Booking Team</p>
+    </body>
+    </html>
+    """)
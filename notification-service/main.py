@@ -3,7 +3,9 @@ from api.controllers import router
 from api.middleware import LoggingMiddleware  # Import the middleware
 from api.logger import logger  # Import the logger
 from metrics import setup_metrics # importing metrics setup
+from api.service_client import close_service_clients
 from rabbitmq_consumer import start_consumer
+from api.services import notification_coalescer
 
 import threading
 
@@ -14,6 +16,12 @@ app.add_middleware(LoggingMiddleware)
 
 app.include_router(router)
 
+# Close pooled inter-service HTTP connections on shutdown
+app.add_event_handler("shutdown", close_service_clients)
+
+# Send any digests still waiting in the coalescing window
+app.add_event_handler("shutdown", notification_coalescer.close)
+
 # Initialize Prometheus metrics
 setup_metrics(app)
 
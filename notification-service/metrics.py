@@ -1,5 +1,24 @@
+from prometheus_client import Counter
 from prometheus_fastapi_instrumentator import Instrumentator
 
+# payment_events consumer retry / dead-letter flow
+MESSAGES_RETRIED = Counter("notification_messages_retried_total", "Messages sent to a delayed retry queue")
+MESSAGES_DEAD_LETTERED = Counter(
+    "notification_messages_dead_lettered_total", "Messages moved to the dead-letter queue", ["reason"]
+)
+
+# Enrichment lookups served from the local cache, by cache ("ticket" or "user")
+ENRICHMENT_CACHE_HITS = Counter(
+    "notification_enrichment_cache_hits_total", "Enrichment lookups served from the local cache", ["cache"]
+)
+ENRICHMENT_CACHE_MISSES = Counter(
+    "notification_enrichment_cache_misses_total", "Enrichment lookups that needed an upstream call", ["cache"]
+)
+
+# Per-recipient digest coalescing
+NOTIFICATIONS_COALESCED = Counter("notification_sections_coalesced_total", "Notification sections merged into digest emails")
+DIGEST_EMAILS_SENT = Counter("notification_digest_emails_total", "Digest emails handed to the SMTP dispatcher")
+
 def setup_metrics(app):
     instrumentator = Instrumentator().instrument(app)
     instrumentator.expose(app, include_in_schema=False)
\ No newline at end of file
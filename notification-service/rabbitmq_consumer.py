@@ -1,9 +1,12 @@
 import pika
+import functools
 import json
 import os
 import time
+from concurrent.futures import Future, ThreadPoolExecutor
 from api.logger import logger
-from api.services import process_payment_completed_event
+from api.services import process_payment_completed_event, enrich_payment_events
+from metrics import MESSAGES_RETRIED, MESSAGES_DEAD_LETTERED
 
 # RabbitMQ connection parameters
 RABBITMQ_HOST = os.getenv("RABBITMQ_HOST", "localhost")
@@ -11,6 +14,23 @@ RABBITMQ_PORT = int(os.getenv("RABBITMQ_PORT", 5672))
 RABBITMQ_USER = os.getenv("RABBITMQ_USER", "guest")
 RABBITMQ_PASS = os.getenv("RABBITMQ_PASS", "guest")
 
+# Consumer tuning: how many unacked messages the broker hands us, and how many we work on at once
+PREFETCH_COUNT = int(os.getenv("RABBITMQ_PREFETCH_COUNT", 32))
+CONSUMER_WORKERS = int(os.getenv("RABBITMQ_CONSUMER_WORKERS", 16))
+
+# Prefetched messages are enriched together: up to ENRICH_BATCH_SIZE, or whatever arrived within ENRICH_BATCH_WAIT seconds
+ENRICH_BATCH_SIZE = int(os.getenv("ENRICH_BATCH_SIZE", 16))
+ENRICH_BATCH_WAIT = float(os.getenv("ENRICH_BATCH_WAIT", 0.05))
+
+# Retry topology: failed messages wait in payment_events.retry.<n> (TTL base * 2^n) and are
+# dead-lettered back to payment_events; after MAX_RETRIES they are parked in payment_events.dlq
+EVENTS_QUEUE = "payment_events"
+DEAD_LETTER_QUEUE = f"{EVENTS_QUEUE}.dlq"
+MAX_RETRIES = int(os.getenv("RABBITMQ_MAX_RETRIES", 5))
+RETRY_BASE_DELAY_MS = int(os.getenv("RABBITMQ_RETRY_BASE_DELAY_MS", 5000))
+RETRY_COUNT_HEADER = "x-retry-count"
+FAILURE_REASON_HEADER = "x-failure-reason"
+
 def get_connection():
     """
     Create a connection to RabbitMQ
@@ -25,9 +45,39 @@ def get_connection():
     )
     return pika.BlockingConnection(parameters)
 
-def process_message(ch, method, properties, body):
+def retry_queue(attempt):
+    return f"{EVENTS_QUEUE}.retry.{attempt}"
+
+def declare_topology(channel):
     """
-    Process messages from RabbitMQ
+    Declare the events queue, one delay queue per retry attempt and the dead-letter queue
+    """
+    channel.queue_declare(queue=EVENTS_QUEUE, durable=True)
+    for attempt in range(MAX_RETRIES):
+        channel.queue_declare(
+            queue=retry_queue(attempt),
+            durable=True,
+            arguments={
+                # per-queue TTL, so every message in a queue waits the same time and none blocks another
+                "x-message-ttl": RETRY_BASE_DELAY_MS * (2 ** attempt),
+                "x-dead-letter-exchange": "",
+                "x-dead-letter-routing-key": EVENTS_QUEUE,
+            }
+        )
+    channel.queue_declare(queue=DEAD_LETTER_QUEUE, durable=True)
+
+# Message outcomes
+ACK = "ack"
+RETRY = "retry"
+REJECT = "reject"
+
+worker_pool = ThreadPoolExecutor(max_workers=CONSUMER_WORKERS, thread_name_prefix="notification-worker")
+
+def handle_message(body, enrichment=None):
+    """
+    Process a message body and decide how it should be settled.
+    `enrichment` is the (tickets, users) pair looked up for the message's batch.
+    Payment events return a future that resolves once their emails are sent.
     """
     try:
         message = json.loads(body)
@@ -36,25 +86,193 @@ def process_message(ch, method, properties, body):
         event_type = message.get("event_type")
         if event_type == "payment.completed":
             # Process payment completed event
-            success = process_payment_completed_event(message.get("payload", {}))
-            if success:
-                # Acknowledge the message
-                ch.basic_ack(delivery_tag=method.delivery_tag)
-            else:
-                # Negative acknowledge, requeue the message
-                ch.basic_nack(delivery_tag=method.delivery_tag, requeue=True)
+            tickets, users = enrichment or (None, None)
+            # Acknowledged once sent, otherwise retried later (see settle_when_sent)
+            return process_payment_completed_event(message.get("payload", {}), tickets, users)
         else:
             logger.warning(f"Unknown event type: {event_type}")
             # Acknowledge the message to remove it from the queue
-            ch.basic_ack(delivery_tag=method.delivery_tag)
+            return ACK
     except json.JSONDecodeError:
         logger.error("Failed to decode message as JSON")
-        # Negative acknowledge, don't requeue
-        ch.basic_nack(delivery_tag=method.delivery_tag, requeue=False)
+        # Can never succeed, park it in the dead-letter queue
+        return REJECT
     except Exception as e:
         logger.error(f"Error processing message: {str(e)}")
-        # Negative acknowledge, requeue the message
-        ch.basic_nack(delivery_tag=method.delivery_tag, requeue=True)
+        # Retry the message later
+        return RETRY
+
+def retry_count(properties):
+    headers = (properties.headers if properties else None) or {}
+    return int(headers.get(RETRY_COUNT_HEADER, 0))
+
+def publish_copy(ch, queue_name, body, properties, headers):
+    """
+    Republish a message with extra headers. The consumer channel is in confirm
+    mode, so this returns only once the broker has taken the copy.
+    """
+    ch.basic_publish(
+        exchange='',
+        routing_key=queue_name,
+        body=body,
+        properties=pika.BasicProperties(
+            delivery_mode=2,
+            content_type=properties.content_type if properties else 'application/json',
+            headers={**((properties.headers if properties else None) or {}), **headers}
+        ),
+        mandatory=True
+    )
+
+def settle_message(ch, delivery_tag, properties, body, outcome):
+    """
+    Ack/retry/dead-letter a message. Runs on the connection thread, as pika channels are not thread safe.
+    Retries and dead letters are published first and only then acked, so a crash in between
+    duplicates the message rather than losing it.
+    """
+    if not ch.is_open:
+        # The broker redelivers unacked messages once we reconnect
+        logger.warning(f"Channel closed before message {delivery_tag} could be settled")
+        return
+    if outcome == ACK:
+        ch.basic_ack(delivery_tag=delivery_tag)
+        return
+
+    attempts = retry_count(properties)
+    try:
+        if outcome == RETRY and attempts < MAX_RETRIES:
+            publish_copy(ch, retry_queue(attempts), body, properties, {RETRY_COUNT_HEADER: attempts + 1})
+            MESSAGES_RETRIED.inc()
+            logger.warning(f"Message {delivery_tag} scheduled for retry {attempts + 1} of {MAX_RETRIES}")
+        else:
+            reason = "retries exhausted" if outcome == RETRY else "rejected"
+            publish_copy(ch, DEAD_LETTER_QUEUE, body, properties, {RETRY_COUNT_HEADER: attempts, FAILURE_REASON_HEADER: reason})
+            MESSAGES_DEAD_LETTERED.labels(reason).inc()
+            logger.error(f"Message {delivery_tag} moved to {DEAD_LETTER_QUEUE}: {reason}")
+    except Exception as e:
+        # Couldn't hand the message on; leave it with the broker and let the channel redeliver it
+        logger.error(f"Could not republish message {delivery_tag}: {str(e)}")
+        ch.basic_nack(delivery_tag=delivery_tag, requeue=True)
+        return
+    ch.basic_ack(delivery_tag=delivery_tag)
+
+def schedule_settle(connection, ch, delivery_tag, properties, body, outcome):
+    try:
+        connection.add_callback_threadsafe(functools.partial(settle_message, ch, delivery_tag, properties, body, outcome))
+    except Exception as e:
+        logger.error(f"Could not settle message {delivery_tag}: {str(e)}")
+
+def settle_when_sent(connection, ch, delivery_tag, properties, body, sent):
+    try:
+        success = sent.result()
+    except Exception as e:
+        logger.error(f"Sending notifications for message {delivery_tag} failed: {str(e)}")
+        success = False
+    schedule_settle(connection, ch, delivery_tag, properties, body, ACK if success else RETRY)
+
+def process_and_settle(connection, ch, delivery_tag, properties, body, enrichment=None):
+    outcome = handle_message(body, enrichment)
+    if isinstance(outcome, Future):
+        # held unacked while its digest is coalesced; PREFETCH_COUNT bounds how many wait at once
+        outcome.add_done_callback(functools.partial(settle_when_sent, connection, ch, delivery_tag, properties, body))
+    else:
+        schedule_settle(connection, ch, delivery_tag, properties, body, outcome)
+
+def payment_payload(body):
+    try:
+        message = json.loads(body)
+    except json.JSONDecodeError:
+        return None
+    if not isinstance(message, dict) or message.get("event_type") != "payment.completed":
+        return None
+    return message.get("payload") or {}
+
+def enrich_and_dispatch(connection, ch, batch):
+    """
+    Look up details for a whole batch (one call per upstream), then process each message on the pool
+    """
+    payloads = [payload for payload in (payment_payload(body) for _, _, body in batch) if payload is not None]
+    enrichment = enrich_payment_events(payloads) if payloads else None
+    for delivery_tag, properties, body in batch:
+        worker_pool.submit(process_and_settle, connection, ch, delivery_tag, properties, body, enrichment)
+
+class MessageBatcher:
+    """
+    Groups deliveries on the connection thread and hands each group to the worker pool
+    """
+
+    def __init__(self, connection, channel, batch_size=ENRICH_BATCH_SIZE, max_wait=ENRICH_BATCH_WAIT):
+        self.connection = connection
+        self.channel = channel
+        self.batch_size = batch_size
+        self.max_wait = max_wait
+        self.pending = []
+
+    def add(self, ch, method, properties, body):
+        self.pending.append((method.delivery_tag, properties, body))
+        if len(self.pending) >= self.batch_size:
+            self.flush()
+        elif len(self.pending) == 1:
+            self.connection.call_later(self.max_wait, self.flush)
+
+    def flush(self):
+        if not self.pending:
+            return
+        batch, self.pending = self.pending, []
+        worker_pool.submit(enrich_and_dispatch, self.connection, self.channel, batch)
+
+def peek_dead_letters(limit=50):
+    """
+    Read up to `limit` dead-lettered messages without removing them
+    """
+    connection = get_connection()
+    try:
+        channel = connection.channel()
+        declare_topology(channel)
+        messages = []
+        for _ in range(limit):
+            method, properties, body = channel.basic_get(queue=DEAD_LETTER_QUEUE, auto_ack=False)
+            if method is None:
+                break
+            headers = properties.headers or {}
+            try:
+                message = json.loads(body)
+            except json.JSONDecodeError:
+                message = body.decode("utf-8", errors="replace")
+            messages.append({
+                "retry_count": int(headers.get(RETRY_COUNT_HEADER, 0)),
+                "reason": headers.get(FAILURE_REASON_HEADER),
+                "message": message
+            })
+        # hand everything back to the queue, in order
+        if messages:
+            channel.basic_nack(delivery_tag=0, multiple=True, requeue=True)
+        return messages
+    finally:
+        connection.close()
+
+def replay_dead_letters(limit=50):
+    """
+    Move up to `limit` dead-lettered messages back onto the events queue with a fresh retry budget
+    """
+    connection = get_connection()
+    try:
+        channel = connection.channel()
+        channel.confirm_delivery()
+        declare_topology(channel)
+        replayed = 0
+        for _ in range(limit):
+            method, properties, body = channel.basic_get(queue=DEAD_LETTER_QUEUE, auto_ack=False)
+            if method is None:
+                break
+            headers = {key: value for key, value in (properties.headers or {}).items() if key != FAILURE_REASON_HEADER}
+            properties.headers = headers
+            publish_copy(channel, EVENTS_QUEUE, body, properties, {RETRY_COUNT_HEADER: 0})
+            channel.basic_ack(delivery_tag=method.delivery_tag)
+            replayed += 1
+        logger.info(f"Replayed {replayed} messages from {DEAD_LETTER_QUEUE}")
+        return replayed
+    finally:
+        connection.close()
 
 def start_consumer():
     """
@@ -66,20 +284,26 @@ def start_consumer():
             connection = get_connection()
             channel = connection.channel()
             
-            # Declare the queue
-            channel.queue_declare(queue='payment_events', durable=True)
+            # Declare the queue with its retry and dead-letter queues
+            declare_topology(channel)
+            
+            # Confirm mode, so retries and dead letters are on the broker before we ack
+            channel.confirm_delivery()
             
             # Set prefetch count
-            channel.basic_qos(prefetch_count=1)
+            channel.basic_qos(prefetch_count=PREFETCH_COUNT)
             
-            # Set up the consumer
+            # Set up the consumer; deliveries are grouped for batched enrichment
+            batcher = MessageBatcher(connection, channel)
             channel.basic_consume(
-                queue='payment_events',
-                on_message_callback=process_message,
+                queue=EVENTS_QUEUE,
+                on_message_callback=batcher.add,
                 auto_ack=False
             )
             
-            logger.info("Started consuming messages from payment_events queue")
+            logger.info(
+                f"Started consuming messages from payment_events queue (prefetch {PREFETCH_COUNT}, {CONSUMER_WORKERS} workers)"
+            )
             
             # Start consuming
             channel.start_consuming()
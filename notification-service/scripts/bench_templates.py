@@ -0,0 +1,71 @@
+"""
+Benchmark: rendering notification emails from the compiled template registry.
+
+Renders every registered template with sample data through str.format on the
+template source (the old path) and through CompiledTemplate.render, checks the
+output is identical, and reports renders/s per core for each. Rendering is CPU
+bound and runs on one thread here, so the single-thread rate is the per-core rate.
+No SMTP server or broker needed.
+
+    python scripts/bench_templates.py --renders 100000
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from api.templates import template_registry  # noqa: E402
+
+SAMPLE_DATA = {
+    "otp": {"otp": "482913"},
+    "booking_confirmation": {
+        "name": "Asha", "train_name": "Rajdhani Express", "source": "Delhi", "destination": "Mumbai",
+        "date": "2026-11-02 16:55", "seat": "B4-32", "ticket_id": 918273,
+    },
+    "payment_confirmation": {
+        "name": "Asha", "amount": 1450.0, "currency": "INR", "payment_id": "pay_8f2c1d",
+        "transaction_id": "txn_40c9e7", "ticket_id": 918273,
+    },
+    "general": {"subject": "Schedule change", "name": "Asha", "message": "Your train now departs at 17:10."},
+    "payment_confirmation_section": {
+        "payment_id": "pay_8f2c1d", "transaction_id": "txn_40c9e7", "amount": 1450.0, "currency": "INR",
+        "ticket_id": 918273,
+    },
+    "booking_confirmation_section": {
+        "train_name": "Rajdhani Express", "source": "Delhi", "destination": "Mumbai", "date": "2026-11-02 16:55",
+        "seat": "B4-32", "ticket_id": 918273,
+    },
+    "booking_digest": {"name": "Asha", "sections": "<h2>Booking Confirmation</h2>"},
+}
+
+
+def renders_per_second(render, renders):
+    start = time.perf_counter()
+    for _ in range(renders):
+        render()
+    return renders / (time.perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--renders", type=int, default=100_000, help="renders per template and path")
+    args = parser.parse_args()
+
+    print(f"{args.renders} renders per template, one core")
+    print(f"{'template':>32} {'format/s/core':>14} {'compiled/s/core':>16} {'speedup':>8}")
+    for template_id, data in SAMPLE_DATA.items():
+        template = template_registry.get(template_id)
+        assert template.render(data) == template.source.format(**data), f"{template.key} renders differently"
+
+        format_rate = renders_per_second(lambda: template.source.format(**data), args.renders)
+        compiled_rate = renders_per_second(lambda: template.render(data), args.renders)
+        print(
+            f"{template.key:>32} {format_rate:>14.0f} {compiled_rate:>16.0f}"
+            f" {compiled_rate / format_rate:>7.2f}x"
+        )
+
+
+if __name__ == "__main__":
+    main()
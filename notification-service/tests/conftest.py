@@ -0,0 +1,5 @@
+import os
+import sys
+
+# the service runs with its own directory as the import root (api.*, metrics, ...)
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
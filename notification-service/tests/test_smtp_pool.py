@@ -0,0 +1,92 @@
+"""
+SMTPConnectionPool / EmailDispatcher against a local aiosmtpd server.
+Needs the test dependencies: pip install -r requirements-dev.txt
+"""
+import socket
+import threading
+from email.message import EmailMessage
+
+import pytest
+from aiosmtpd.controller import Controller
+
+from api.smtp_pool import EmailDispatcher, SMTPConnectionPool
+
+REFUSED_RECIPIENT = "refused@example.com"
+
+
+class RecordingHandler:
+    def __init__(self):
+        self.sessions = set()
+        self.messages = []
+        self.lock = threading.Lock()
+
+    async def handle_RCPT(self, server, session, envelope, address, rcpt_options):
+        if address == REFUSED_RECIPIENT:
+            return "550 mailbox unavailable"
+        envelope.rcpt_tos.append(address)
+        return "250 OK"
+
+    async def handle_DATA(self, server, session, envelope):
+        with self.lock:
+            self.sessions.add(id(session))
+            self.messages.append(envelope.rcpt_tos[:])
+        return "250 Message accepted for delivery"
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+@pytest.fixture
+def smtp_server():
+    handler = RecordingHandler()
+    controller = Controller(handler, hostname="127.0.0.1", port=free_port())
+    controller.start()
+    try:
+        yield handler, controller.hostname, controller.port
+    finally:
+        controller.stop()
+
+
+def make_message(to_email):
+    message = EmailMessage()
+    message["From"] = "noreply@example.com"
+    message["To"] = to_email
+    message["Subject"] = "Test"
+    message.set_content("hello")
+    return message
+
+
+def test_pool_reuses_session(smtp_server):
+    handler, host, port = smtp_server
+    pool = SMTPConnectionPool(host, port, max_connections=1)
+    try:
+        for index in range(5):
+            with pool.connection() as server:
+                server.send_message(make_message(f"user{index}@example.com"))
+    finally:
+        pool.close()
+
+    assert len(handler.messages) == 5
+    assert len(handler.sessions) == 1
+
+
+def test_dispatcher_batches_and_isolates_refused_recipient(smtp_server):
+    handler, host, port = smtp_server
+    pool = SMTPConnectionPool(host, port, max_connections=2)
+    dispatcher = EmailDispatcher(pool, workers=2, batch_size=10)
+
+    recipients = [f"user{index}@example.com" for index in range(20)] + [REFUSED_RECIPIENT]
+    futures = {to_email: dispatcher.submit(make_message(to_email)) for to_email in recipients}
+
+    refused = futures.pop(REFUSED_RECIPIENT)
+    assert all(future.result(timeout=10) for future in futures.values())
+    with pytest.raises(Exception):
+        refused.result(timeout=10)
+
+    assert sorted(rcpt for rcpts in handler.messages for rcpt in rcpts) == sorted(futures)
+    # at most one session per worker, however many messages went through
+    assert len(handler.sessions) <= 2
+    pool.close()
@@ -1,14 +1,14 @@
 from fastapi import APIRouter, Depends, HTTPException, Header
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 from api.schema import PaymentInitiateRequest, PaymentResponse, PaymentConfirmRequest
 from api import services
-from databaseConfig import get_db
+from databaseConfig import get_async_db
 
 router = APIRouter()
 
 @router.post("/payment/initiate")
 async def initiate_payment(payment: PaymentInitiateRequest, 
-                          db: Session = Depends(get_db), 
+                          db: AsyncSession = Depends(get_async_db), 
                           authorization: str = Header(None)):
     """
     Initiate a payment request for a ticket booking
@@ -17,11 +17,11 @@ async def initiate_payment(payment: PaymentInitiateRequest,
         raise HTTPException(status_code=401, detail="Bearer token missing or Invalid.")
     
     bearer_token = authorization.split(' ')[1]
-    return services.initiate_payment(payment, db, bearer_token)
+    return await services.initiate_payment(payment, db, bearer_token)
 
 @router.post("/payment/confirm")
 async def confirm_payment(payment: PaymentConfirmRequest, 
-                         db: Session = Depends(get_db), 
+                         db: AsyncSession = Depends(get_async_db), 
                          authorization: str = Header(None)):
     """
     Confirm payment status, which will trigger RabbitMQ event for notification
@@ -30,4 +30,4 @@ async def confirm_payment(payment: PaymentConfirmRequest,
         raise HTTPException(status_code=401, detail="Bearer token missing or Invalid.")
     
     bearer_token = authorization.split(' ')[1]
-    return services.confirm_payment(payment, db, bearer_token)
\ No newline at end of file
+    return await services.confirm_payment(payment, db, bearer_token)
\ No newline at end of file
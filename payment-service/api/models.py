@@ -1,4 +1,4 @@
-from sqlalchemy import Column, DateTime, String, Integer, Float, ForeignKey
+from sqlalchemy import JSON, Column, DateTime, String, Integer, Float, ForeignKey, Index, text
 from sqlalchemy.sql import func
 
 from databaseConfig import Base
@@ -16,4 +16,23 @@ class Payment(Base):
     payment_method = Column(String(20), nullable=False)
     transaction_id = Column(String(100), nullable=True)
     created_at = Column(DateTime, default=func.now())
-    updated_at = Column(DateTime, onupdate=func.now())
\ No newline at end of file
+    updated_at = Column(DateTime, onupdate=func.now())
+
+class OutboxEvent(Base):
+    __tablename__ = 'outbox_event'
+
+    # Written in the same transaction as the change it describes; the relay publishes it later
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    queue_name = Column(String(100), nullable=False)
+    event_type = Column(String(50), nullable=False)
+    message = Column(JSON, nullable=False)
+    attempts = Column(Integer, nullable=False, default=0)
+    last_error = Column(String(255), nullable=True)
+    claimed_until = Column(DateTime, nullable=True)  # lease held by a relay while the event is being published
+    created_at = Column(DateTime, default=func.now())
+    published_at = Column(DateTime, nullable=True)
+
+    __table_args__ = (
+        # the relay only ever scans unpublished rows in id order
+        Index('ix_outbox_event_unpublished', 'id', postgresql_where=text("published_at IS NULL")),
+    )
@@ -1,94 +1,60 @@
 from fastapi import HTTPException
 from api.logger import logger
-from sqlalchemy.orm import Session
-from api.models import Payment
+from sqlalchemy.ext.asyncio import AsyncSession
+from api.models import Payment, OutboxEvent
 from api.schema import PaymentInitiateRequest, PaymentResponse, PaymentConfirmRequest, PaymentStatus
-from rabbitmq_client import publish_message
+from api.token_verifier import verify_token
+from api.service_client import train_client
+from outbox_relay import outbox_relay
 
-import os
+import httpx
 import uuid
-import requests
 from datetime import datetime
 
-# For sync calls to auth service
-NGINX_HOST = os.getenv("NGINX_HOST", "localhost")
-
-def initiate_payment(payment: PaymentInitiateRequest, db: Session, bearer_token: str):
+async def initiate_payment(payment: PaymentInitiateRequest, db: AsyncSession, bearer_token: str):
     """
     Initiate a payment for a ticket booking
     """
     # Verify the user's identity
-    try:
-        endpoint = f"http://{NGINX_HOST}/verify-token"
-        headers = {"Authorization": f"Bearer {bearer_token}"}
-        response = requests.get(endpoint, headers=headers)
-        response.raise_for_status()
-        user_id = response.json().get('id')
-    except Exception as e:
-        logger.error(f"Error verifying token: {e}")
-        raise HTTPException(status_code=500, detail="Internal server error while verifying token with auth service")
+    user_id = (await verify_token(bearer_token))["id"]
     
     ticket_id = payment.ticket_id
     
     # If no specific ticket ID is provided, find an available one
     if ticket_id is None:
         try:
-            endpoint = f"http://{NGINX_HOST}/ticket/{payment.train_id}"
-            logger.info(f"Checking tickets for train at endpoint: {endpoint}")
-            response = requests.get(endpoint)
-            logger.info(f"Got response: {response.status_code}")
-            response.raise_for_status()
-            tickets = response.json()
-            logger.info(f"Found {len(tickets)} tickets for train {payment.train_id}")
-            
-            # Filter for available tickets
-            available_tickets = [ticket for ticket in tickets if ticket.get("status") == "available"]
-            if not available_tickets:
-                logger.error(f"No available tickets for train {payment.train_id}")
-                raise HTTPException(status_code=400, detail="No available tickets for this train")
-            
-            # Select the first available ticket
-            selected_ticket = available_tickets[0]
+            endpoint = f"/ticket/{payment.train_id}/next-available"
+            logger.info(f"Finding next available ticket at endpoint: {endpoint}")
+            selected_ticket = await train_client.get_json(endpoint)
             ticket_id = selected_ticket["id"]
             logger.info(f"Selected ticket {ticket_id} for train {payment.train_id}")
             
-        except HTTPException as he:
-            raise he
+        except httpx.HTTPStatusError as e:
+            if e.response.status_code == 404:
+                logger.error(f"No available tickets for train {payment.train_id}")
+                raise HTTPException(status_code=400, detail="No available tickets for this train")
+            logger.error(f"Error finding available ticket: {e}")
+            raise HTTPException(status_code=500, detail="Internal server error while finding ticket")
         except Exception as e:
             logger.error(f"Error finding available ticket: {e}")
             raise HTTPException(status_code=500, detail="Internal server error while finding ticket")
     else:
-        # Verify the specified ticket exists and is available
+        # Verify the specified ticket belongs to the train and is available
         try:
-            # First check if the ticket belongs to the specified train
-            endpoint = f"http://{NGINX_HOST}/ticket/{payment.train_id}"
-            response = requests.get(endpoint)
-            response.raise_for_status()
-            tickets = response.json()
-            
-            # Find the specified ticket
-            ticket_found = False
-            ticket_available = False
-            for ticket in tickets:
-                if ticket.get("id") == ticket_id:
-                    ticket_found = True
-                    if ticket.get("status") == "available":
-                        ticket_available = True
-                    break
-            
-            if not ticket_found:
+            ticket = await train_client.get_json(f"/ticket/{payment.train_id}/{ticket_id}/status")
+        except httpx.HTTPStatusError as e:
+            if e.response.status_code == 404:
                 logger.error(f"Ticket {ticket_id} not found for train {payment.train_id}")
                 raise HTTPException(status_code=400, detail="Ticket not found for this train")
-                
-            if not ticket_available:
-                logger.error(f"Ticket {ticket_id} is not available")
-                raise HTTPException(status_code=400, detail="Ticket is not available for booking")
-                
-        except HTTPException as he:
-            raise he
+            logger.error(f"Error verifying ticket availability: {e}")
+            raise HTTPException(status_code=500, detail="Internal server error while verifying ticket")
         except Exception as e:
             logger.error(f"Error verifying ticket availability: {e}")
             raise HTTPException(status_code=500, detail="Internal server error while verifying ticket")
+        
+        if ticket.get("status") != "available":
+            logger.error(f"Ticket {ticket_id} is not available")
+            raise HTTPException(status_code=400, detail="Ticket is not available for booking")
     
     # Create a new payment record
     payment_id = str(uuid.uuid4())
@@ -105,8 +71,8 @@ def initiate_payment(payment: PaymentInitiateRequest, db: Session, bearer_token:
     )
     
     db.add(new_payment)
-    db.commit()
-    db.refresh(new_payment)
+    await db.commit()
+    await db.refresh(new_payment)
     
     logger.info(f"Payment initiated for ticket {ticket_id} (train {payment.train_id}) by user {user_id}")
     
@@ -122,23 +88,15 @@ def initiate_payment(payment: PaymentInitiateRequest, db: Session, bearer_token:
         created_at=new_payment.created_at
     )
 
-def confirm_payment(payment: PaymentConfirmRequest, db: Session, bearer_token: str):
+async def confirm_payment(payment: PaymentConfirmRequest, db: AsyncSession, bearer_token: str):
     """
     Confirm payment status and trigger notification via RabbitMQ
     """
     # Verify user
-    try:
-        endpoint = f"http://{NGINX_HOST}/verify-token"
-        headers = {"Authorization": f"Bearer {bearer_token}"}
-        response = requests.get(endpoint, headers=headers)
-        response.raise_for_status()
-        user_id = response.json().get('id')
-    except Exception as e:
-        logger.error(f"Error verifying token: {e}")
-        raise HTTPException(status_code=500, detail="Internal server error while verifying token with auth service")
+    user_id = (await verify_token(bearer_token))["id"]
     
     # Get payment record
-    payment_record = db.query(Payment).filter(Payment.id == payment.payment_id).first()
+    payment_record = await db.get(Payment, payment.payment_id)
     if not payment_record:
         logger.error(f"Payment {payment.payment_id} not found")
         raise HTTPException(status_code=404, detail="Payment not found")
@@ -153,12 +111,8 @@ def confirm_payment(payment: PaymentConfirmRequest, db: Session, bearer_token: s
     payment_record.transaction_id = payment.transaction_id
     payment_record.updated_at = datetime.now()
     
-    db.commit()
-    db.refresh(payment_record)
-    
-    logger.info(f"Payment {payment.payment_id} updated to status {payment.status}")
-    
-    # If payment is completed, publish message for notification service
+    # If payment is completed, record the event for the notification service in the
+    # same transaction; the outbox relay publishes it to RabbitMQ after commit
     if payment.status == PaymentStatus.COMPLETED:
         message = {
             "event_type": "payment.completed",
@@ -170,12 +124,15 @@ def confirm_payment(payment: PaymentConfirmRequest, db: Session, bearer_token: s
                 "transaction_id": payment_record.transaction_id
             }
         }
-        try:
-            publish_message("payment_events", message)
-            logger.info(f"Published payment.completed event for payment {payment.payment_id}")
-        except Exception as e:
-            logger.error(f"Error publishing payment event: {e}")
-            # Continue processing even if message publishing fails
+        db.add(OutboxEvent(queue_name="payment_events", event_type=message["event_type"], message=message))
+    
+    await db.commit()
+    
+    logger.info(f"Payment {payment.payment_id} updated to status {payment.status}")
+    
+    if payment.status == PaymentStatus.COMPLETED:
+        outbox_relay.notify()
+        logger.info(f"Queued payment.completed event for payment {payment.payment_id}")
     
     # Transform to response model
     # Transform to response model
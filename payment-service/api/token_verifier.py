@@ -0,0 +1,109 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+
+import httpx
+import jwt
+from fastapi import HTTPException
+from jwt.exceptions import InvalidTokenError
+
+from api.logger import logger
+from api.service_client import auth_client
+
+# Must match the signing configuration of auth-service.
+# HS* algorithms use JWT_SECRET_KEY, RS*/ES*/PS*/EdDSA use the PEM encoded JWT_PUBLIC_KEY.
+JWT_ALGORITHM = os.getenv("JWT_ALGORITHM", "HS256")
+JWT_SECRET_KEY = os.getenv("JWT_SECRET_KEY", "09d25e094faa6ca2556c818166b7a9563b93f7099f6f0f4caa6cf63b88e8d3e7")
+JWT_PUBLIC_KEY = os.getenv("JWT_PUBLIC_KEY")
+
+# Maximum number of verified tokens kept in memory
+TOKEN_CACHE_SIZE = int(os.getenv("TOKEN_CACHE_SIZE", 10000))
+
+_claims_cache = OrderedDict()  # token -> verified claims
+_cache_lock = threading.Lock()
+_revocation_check = None
+
+
+def set_revocation_check(check):
+    """
+    Register a callable(claims) -> bool that returns True for revoked tokens.
+    It runs on every verification, including cache hits.
+    """
+    global _revocation_check
+    _revocation_check = check
+
+
+def _verification_key():
+    if JWT_ALGORITHM.startswith("HS"):
+        return JWT_SECRET_KEY
+    return JWT_PUBLIC_KEY
+
+
+def _get_cached_claims(token):
+    with _cache_lock:
+        claims = _claims_cache.get(token)
+        if claims is None:
+            return None
+        if claims.get("exp") is not None and claims["exp"] <= time.time():
+            del _claims_cache[token]
+            return None
+        _claims_cache.move_to_end(token)
+        return claims
+
+
+def _cache_claims(token, claims):
+    with _cache_lock:
+        _claims_cache[token] = claims
+        _claims_cache.move_to_end(token)
+        while len(_claims_cache) > TOKEN_CACHE_SIZE:
+            _claims_cache.popitem(last=False)
+
+
+async def _fetch_remote_claims(token, claims):
+    """
+    Tokens issued before auth-service embedded the user id only carry the username,
+    so resolve the id through /verify-token once and cache it with the token.
+    """
+    headers = {"Authorization": f"Bearer {token}"}
+    user = await auth_client.get_json("/verify-token", headers=headers)
+    return {**claims, "id": user.get("id"), "sub": user.get("username", claims.get("sub"))}
+
+
+async def verify_token(token) -> dict:
+    """
+    Verify a bearer token locally and return its claims (sub, id, exp)
+    """
+    credentials_exception = HTTPException(
+        status_code=401,
+        detail="Could not validate credentials",
+        headers={"WWW-Authenticate": "Bearer"},
+    )
+
+    claims = _get_cached_claims(token)
+    if claims is None:
+        try:
+            claims = jwt.decode(token, _verification_key(), algorithms=[JWT_ALGORITHM])
+        except InvalidTokenError as e:
+            logger.error(f"Invalid token: {e}")
+            raise credentials_exception
+        if claims.get("sub") is None:
+            raise credentials_exception
+
+        if claims.get("id") is None:
+            try:
+                claims = await _fetch_remote_claims(token, claims)
+            except httpx.HTTPStatusError as e:
+                logger.error(f"Auth service rejected token: {e}")
+                raise credentials_exception
+            except Exception as e:
+                logger.error(f"Error verifying token: {e}")
+                raise HTTPException(status_code=500, detail="Internal server error while verifying token with auth service")
+
+        _cache_claims(token, claims)
+
+    if _revocation_check is not None and _revocation_check(claims):
+        logger.error(f"Revoked token presented for user {claims.get('sub')}")
+        raise credentials_exception
+
+    return claims
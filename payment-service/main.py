@@ -6,6 +6,9 @@ import api.models as models
 from api.middleware import LoggingMiddleware  # Import the middleware
 from api.logger import logger  # Import the logger
 from metrics import setup_metrics # importing metrics setup
+from api.service_client import close_service_clients
+from rabbitmq_client import publisher
+from outbox_relay import outbox_relay
 
 app = FastAPI(openapi_url="/payment/openapi.json", docs_url="/payment/docs")
 
@@ -16,6 +19,16 @@ models.Base.metadata.create_all(bind=engine)
 
 app.include_router(router)
 
+# Close pooled inter-service HTTP connections on shutdown
+app.add_event_handler("shutdown", close_service_clients)
+
+# Relay committed outbox events to RabbitMQ in the background
+app.add_event_handler("startup", outbox_relay.start)
+app.add_event_handler("shutdown", outbox_relay.stop)
+
+# Flush buffered RabbitMQ messages on shutdown
+app.add_event_handler("shutdown", publisher.close)
+
 # Initialize Prometheus metrics
 setup_metrics(app)
 
@@ -1,4 +1,59 @@
+import time
+
+from prometheus_client import Counter, Gauge, Histogram
 from prometheus_fastapi_instrumentator import Instrumentator
+from sqlalchemy import event
+from sqlalchemy import exc as sqlalchemy_exc
+
+# Database connection pool metrics, labelled by engine ("sync" or "async")
+DB_POOL_CHECKED_OUT = Gauge("db_pool_checked_out_connections", "Connections currently checked out of the pool", ["engine"])
+DB_POOL_OVERFLOW = Gauge("db_pool_overflow_connections", "Connections open beyond pool_size", ["engine"])
+DB_POOL_WAIT_SECONDS = Histogram(
+    "db_pool_wait_seconds",
+    "Time spent waiting to get a connection from the pool",
+    ["engine"],
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30),
+)
+DB_POOL_OVERFLOW_EVENTS = Counter("db_pool_overflow_events_total", "Connections opened beyond pool_size", ["engine"])
+DB_POOL_TIMEOUTS = Counter("db_pool_timeouts_total", "Checkouts that gave up after pool_timeout", ["engine"])
+
+def timed_pool_class(pool_class, engine_name):
+    """
+    Subclass a SQLAlchemy pool so every checkout records how long it waited
+    """
+    class TimedPool(pool_class):
+        def _do_get(self):
+            start = time.perf_counter()
+            try:
+                return super()._do_get()
+            except sqlalchemy_exc.TimeoutError:
+                DB_POOL_TIMEOUTS.labels(engine_name).inc()
+                raise
+            finally:
+                DB_POOL_WAIT_SECONDS.labels(engine_name).observe(time.perf_counter() - start)
+
+    return TimedPool
+
+def instrument_pool(pool, engine_name):
+    """
+    Keep the checked-out and overflow gauges in sync with the pool
+    """
+    def update_gauges(*args):
+        DB_POOL_CHECKED_OUT.labels(engine_name).set(pool.checkedout())
+        DB_POOL_OVERFLOW.labels(engine_name).set(max(pool.overflow(), 0))
+
+    def on_connect(*args):
+        if pool.overflow() > 0:
+            DB_POOL_OVERFLOW_EVENTS.labels(engine_name).inc()
+
+    event.listen(pool, "checkout", update_gauges)
+    event.listen(pool, "checkin", update_gauges)
+    event.listen(pool, "connect", on_connect)
+
+# Transactional outbox relay
+OUTBOX_EVENTS_PUBLISHED = Counter("payment_outbox_events_published_total", "Outbox events confirmed by RabbitMQ")
+OUTBOX_PUBLISH_FAILURES = Counter("payment_outbox_publish_failures_total", "Outbox publish attempts that will be retried")
+OUTBOX_RELAY_BATCH_SECONDS = Histogram("payment_outbox_relay_batch_seconds", "Time to publish and mark one outbox batch")
 
 def setup_metrics(app):
     instrumentator = Instrumentator().instrument(app)
@@ -0,0 +1,178 @@
+import asyncio
+import os
+from datetime import datetime, timedelta
+from sqlalchemy import delete, or_, select, update
+from api.logger import logger
+from api.models import OutboxEvent
+from databaseConfig import AsyncSessionLocal
+from metrics import OUTBOX_EVENTS_PUBLISHED, OUTBOX_PUBLISH_FAILURES, OUTBOX_RELAY_BATCH_SECONDS
+from rabbitmq_client import publisher
+
+# Relay tuning
+OUTBOX_BATCH_SIZE = int(os.getenv("OUTBOX_BATCH_SIZE", 100))
+OUTBOX_POLL_INTERVAL = float(os.getenv("OUTBOX_POLL_INTERVAL", 1.0))  # idle wait between scans
+OUTBOX_PUBLISH_TIMEOUT = float(os.getenv("OUTBOX_PUBLISH_TIMEOUT", 10))  # wait for broker confirms per batch
+# how long a claimed row is hidden from other relays; must outlast the publish timeout
+OUTBOX_CLAIM_LEASE_SECONDS = float(os.getenv("OUTBOX_CLAIM_LEASE_SECONDS", 6 * OUTBOX_PUBLISH_TIMEOUT))
+OUTBOX_RETENTION_HOURS = int(os.getenv("OUTBOX_RETENTION_HOURS", 24))  # published rows kept for inspection
+OUTBOX_PURGE_INTERVAL = 600
+
+class OutboxRelay:
+    """
+    Background task that drains the outbox table into RabbitMQ.
+
+    Each pass claims a batch of unpublished rows by setting a short lease
+    (claimed_until) under FOR UPDATE SKIP LOCKED and commits the claim, so
+    several replicas can relay side by side without holding row locks while
+    the broker is slow. The claimed events go to the persistent confirm-mode
+    publisher outside any transaction; confirmed rows are then marked
+    published. Publishes that fail or time out are cancelled in the publisher
+    and their lease released, so they are retried on the next pass instead of
+    piling up behind the broker. A relay that dies mid-batch leaves leases
+    that simply expire. Delivery is at least once.
+    """
+
+    def __init__(self, batch_size=OUTBOX_BATCH_SIZE, poll_interval=OUTBOX_POLL_INTERVAL):
+        self.batch_size = batch_size
+        self.poll_interval = poll_interval
+        self.wakeup = asyncio.Event()
+        self.task = None
+        self.last_purge = 0.0
+
+    def notify(self):
+        """
+        Wake the relay right after new events are committed instead of waiting for the next poll
+        """
+        self.wakeup.set()
+
+    def start(self):
+        if self.task is None:
+            self.task = asyncio.create_task(self.run())
+            logger.info("Outbox relay started")
+
+    async def stop(self):
+        if self.task is not None:
+            self.task.cancel()
+            try:
+                await self.task
+            except asyncio.CancelledError:
+                pass
+            self.task = None
+            logger.info("Outbox relay stopped")
+
+    async def run(self):
+        while True:
+            try:
+                relayed = await self.relay_batch()
+                if relayed == self.batch_size:
+                    continue  # more rows are probably waiting
+                await self.purge_published()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Outbox relay pass failed: {e}")
+
+            try:
+                await asyncio.wait_for(self.wakeup.wait(), timeout=self.poll_interval)
+            except asyncio.TimeoutError:
+                pass
+            self.wakeup.clear()
+
+    async def relay_batch(self) -> int:
+        events = await self.claim_batch()
+        if not events:
+            return 0
+
+        with OUTBOX_RELAY_BATCH_SECONDS.time():
+            futures = []
+            for event_id, queue_name, message in events:
+                try:
+                    futures.append(asyncio.wrap_future(publisher.publish(queue_name, message)))
+                except Exception as e:
+                    futures.append(asyncio.get_running_loop().create_future())
+                    futures[-1].set_exception(e)
+
+            # confirms arrive in parallel across the publisher channels
+            done, pending = await asyncio.wait(futures, timeout=OUTBOX_PUBLISH_TIMEOUT)
+
+            published_ids = []
+            failures = []
+            for (event_id, _, _), future in zip(events, futures):
+                if future in done and future.exception() is None:
+                    published_ids.append(event_id)
+                elif future in done:
+                    failures.append((event_id, future.exception()))
+                else:
+                    # also cancels the publisher's future, which drops it from the buffer or stops its retries,
+                    # so the next pass doesn't publish it a second time
+                    future.cancel()
+                    failures.append((event_id, "timed out waiting for broker confirm"))
+
+            await self.finish_batch(published_ids, failures)
+
+        OUTBOX_EVENTS_PUBLISHED.inc(len(published_ids))
+        OUTBOX_PUBLISH_FAILURES.inc(len(failures))
+        if failures:
+            logger.error(f"Outbox relay published {len(published_ids)} of {len(events)} events, the rest will be retried")
+        else:
+            logger.info(f"Outbox relay published {len(published_ids)} events")
+        return len(events)
+
+    async def claim_batch(self):
+        """
+        Lease a batch of unpublished rows to this relay; returns (id, queue_name, message) tuples
+        """
+        async with AsyncSessionLocal() as db:
+            now = datetime.now()
+            result = await db.execute(
+                select(OutboxEvent)
+                .where(
+                    OutboxEvent.published_at.is_(None),
+                    or_(OutboxEvent.claimed_until.is_(None), OutboxEvent.claimed_until < now),
+                )
+                .order_by(OutboxEvent.id)
+                .limit(self.batch_size)
+                .with_for_update(skip_locked=True)
+            )
+            events = result.scalars().all()
+            claimed_until = now + timedelta(seconds=OUTBOX_CLAIM_LEASE_SECONDS)
+            claimed = []
+            for event in events:
+                event.claimed_until = claimed_until
+                event.attempts += 1
+                claimed.append((event.id, event.queue_name, event.message))
+            await db.commit()
+            return claimed
+
+    async def finish_batch(self, published_ids, failures):
+        """
+        Mark confirmed rows published and release the lease on the rest so they are retried
+        """
+        async with AsyncSessionLocal() as db:
+            if published_ids:
+                await db.execute(
+                    update(OutboxEvent)
+                    .where(OutboxEvent.id.in_(published_ids))
+                    .values(published_at=datetime.now(), claimed_until=None)
+                )
+            for event_id, error in failures:
+                await db.execute(
+                    update(OutboxEvent)
+                    .where(OutboxEvent.id == event_id)
+                    .values(last_error=str(error)[:255], claimed_until=None)
+                )
+            await db.commit()
+
+    async def purge_published(self):
+        now = asyncio.get_running_loop().time()
+        if now - self.last_purge < OUTBOX_PURGE_INTERVAL:
+            return
+        self.last_purge = now
+        cutoff = datetime.now() - timedelta(hours=OUTBOX_RETENTION_HOURS)
+        async with AsyncSessionLocal() as db:
+            await db.execute(
+                delete(OutboxEvent).where(OutboxEvent.published_at.is_not(None), OutboxEvent.published_at < cutoff)
+            )
+            await db.commit()
+
+outbox_relay = OutboxRelay()
@@ -1,6 +1,10 @@
 import pika
 import json
 import os
+import queue
+import threading
+import time
+from concurrent.futures import Future, InvalidStateError
 from api.logger import logger
 
 # RabbitMQ connection parameters
@@ -9,6 +13,11 @@ RABBITMQ_PORT = int(os.getenv("RABBITMQ_PORT", 5672))
 RABBITMQ_USER = os.getenv("RABBITMQ_USER", "guest")
 RABBITMQ_PASS = os.getenv("RABBITMQ_PASS", "guest")
 
+# Publisher tuning
+PUBLISHER_CHANNELS = int(os.getenv("RABBITMQ_PUBLISHER_CHANNELS", 2))  # one connection + channel per publisher thread
+PUBLISH_BUFFER_SIZE = int(os.getenv("RABBITMQ_PUBLISH_BUFFER_SIZE", 10000))  # messages held while the broker is away
+RECONNECT_MAX_DELAY = float(os.getenv("RABBITMQ_RECONNECT_MAX_DELAY", 30))
+
 def get_connection():
     """
     Create a connection to RabbitMQ
@@ -17,34 +26,165 @@ def get_connection():
     parameters = pika.ConnectionParameters(
         host=RABBITMQ_HOST,
         port=RABBITMQ_PORT,
-        credentials=credentials
+        credentials=credentials,
+        heartbeat=60,
+        blocked_connection_timeout=30
     )
     return pika.BlockingConnection(parameters)
 
-def publish_message(queue_name, message):
+class PublisherChannel:
     """
-    Publish a message to the specified queue
+    A long-lived connection + confirm-mode channel owned by a single publisher thread.
+    pika connections are not thread safe, so each thread in the pool gets its own.
     """
-    try:
-        connection = get_connection()
-        channel = connection.channel()
-        
-        # Declare the queue
-        channel.queue_declare(queue=queue_name, durable=True)
-        
-        # Publish message
+
+    def __init__(self):
+        self.connection = None
+        self.channel = None
+        self.declared_queues = set()
+
+    def ensure_open(self):
+        if self.channel is not None and self.channel.is_open:
+            return self.channel
+        self.close()
+        self.connection = get_connection()
+        self.channel = self.connection.channel()
+        self.channel.confirm_delivery()
+        self.declared_queues = set()
+        logger.info("Connected RabbitMQ publisher channel")
+        return self.channel
+
+    def publish(self, queue_name, body):
+        channel = self.ensure_open()
+        if queue_name not in self.declared_queues:
+            channel.queue_declare(queue=queue_name, durable=True)
+            self.declared_queues.add(queue_name)
+
+        # Blocks until the broker confirms (raises on nack / unroutable)
         channel.basic_publish(
             exchange='',
             routing_key=queue_name,
-            body=json.dumps(message),
+            body=body,
             properties=pika.BasicProperties(
                 delivery_mode=2,  # make message persistent
                 content_type='application/json'
-            )
+            ),
+            mandatory=True
         )
-        
-        connection.close()
-        return True
+
+    def keep_alive(self):
+        # Service heartbeats while idle
+        if self.connection is not None and self.connection.is_open:
+            self.connection.process_data_events(time_limit=0)
+
+    def close(self):
+        try:
+            if self.connection is not None and self.connection.is_open:
+                self.connection.close()
+        except Exception:
+            pass
+        self.connection = None
+        self.channel = None
+
+class RabbitMQPublisher:
+    """
+    Thread-safe publisher backed by a pool of persistent channels.
+    Messages go through a bounded in-memory buffer, so short broker outages
+    are absorbed while the channels reconnect with backoff.
+    """
+
+    def __init__(self, channels=PUBLISHER_CHANNELS, buffer_size=PUBLISH_BUFFER_SIZE):
+        self.channels = channels
+        self.buffer = queue.Queue(maxsize=buffer_size)
+        self.threads = []
+        self.started = False
+        self.stopping = threading.Event()
+        self.lock = threading.Lock()
+
+    def start(self):
+        with self.lock:
+            if self.started:
+                return
+            for index in range(self.channels):
+                thread = threading.Thread(target=self._run, name=f"rabbitmq-publisher-{index}", daemon=True)
+                thread.start()
+                self.threads.append(thread)
+            self.started = True
+
+    def publish(self, queue_name, message) -> Future:
+        """
+        Buffer a message for publishing. The returned future resolves once the broker confirms it.
+        """
+        self.start()
+        future = Future()
+        try:
+            self.buffer.put_nowait((queue_name, json.dumps(message), future))
+        except queue.Full:
+            raise RuntimeError("RabbitMQ publish buffer is full")
+        return future
+
+    def close(self, timeout=5):
+        self.stopping.set()
+        for thread in self.threads:
+            thread.join(timeout=timeout)
+
+    def _run(self):
+        publisher_channel = PublisherChannel()
+        while not (self.stopping.is_set() and self.buffer.empty()):
+            try:
+                queue_name, body, future = self.buffer.get(timeout=1)
+            except queue.Empty:
+                try:
+                    publisher_channel.keep_alive()
+                except Exception:
+                    publisher_channel.close()
+                continue
+
+            if future.cancelled():
+                continue  # the caller gave up on it while it was buffered
+            self._publish_with_retry(publisher_channel, queue_name, body, future)
+        publisher_channel.close()
+
+    @staticmethod
+    def _resolve(future, error=None):
+        # the caller may cancel the future at any point; a late outcome is then dropped
+        try:
+            if error is None:
+                future.set_result(True)
+            else:
+                future.set_exception(error)
+        except InvalidStateError:
+            pass
+
+    def _publish_with_retry(self, publisher_channel, queue_name, body, future):
+        attempt = 0
+        while not future.cancelled():
+            try:
+                publisher_channel.publish(queue_name, body)
+                self._resolve(future)
+                return
+            except (pika.exceptions.NackError, pika.exceptions.UnroutableError) as e:
+                logger.error(f"RabbitMQ rejected message for {queue_name}: {str(e)}")
+                self._resolve(future, e)
+                return
+            except Exception as e:
+                publisher_channel.close()
+                if self.stopping.is_set():
+                    self._resolve(future, e)
+                    return
+                delay = min(0.5 * (2 ** attempt), RECONNECT_MAX_DELAY)
+                attempt += 1
+                logger.error(f"Error publishing message to RabbitMQ: {str(e)}. Retrying in {delay}s")
+                time.sleep(delay)
+
+publisher = RabbitMQPublisher()
+
+def publish_message(queue_name, message):
+    """
+    Publish a message to the specified queue
+    """
+    try:
+        return publisher.publish(queue_name, message)
     except Exception as e:
         logger.error(f"Error publishing message to RabbitMQ: {str(e)}")
-        raise e
\ No newline at end of file
+        raise e
@@ -0,0 +1,104 @@
+"""
+Benchmark: publishing payment events to RabbitMQ.
+
+Compares the old path (a new connection and channel per message) with the
+persistent confirm-mode publisher, reporting messages/s and per-message
+latency. Needs a running RabbitMQ (RABBITMQ_HOST / RABBITMQ_PORT / RABBITMQ_USER /
+RABBITMQ_PASS); publishes to a scratch queue that is deleted afterwards.
+
+    python scripts/bench_publish.py --messages 2000
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pika  # noqa: E402
+
+from rabbitmq_client import RabbitMQPublisher, get_connection  # noqa: E402
+
+BENCH_QUEUE = "bench_payment_events"
+
+
+def sample_message(index):
+    return {
+        "event_type": "payment_completed",
+        "payment_id": index,
+        "ticket_id": index,
+        "user_id": 1,
+        "amount": 100.0,
+        "currency": "INR",
+        "transaction_id": f"bench-{index}",
+    }
+
+
+def connect_per_message(messages):
+    latencies = []
+    for index in range(messages):
+        start = time.perf_counter()
+        connection = get_connection()
+        channel = connection.channel()
+        channel.queue_declare(queue=BENCH_QUEUE, durable=True)
+        channel.basic_publish(
+            exchange='',
+            routing_key=BENCH_QUEUE,
+            body=json.dumps(sample_message(index)),
+            properties=pika.BasicProperties(delivery_mode=2, content_type='application/json')
+        )
+        connection.close()
+        latencies.append(time.perf_counter() - start)
+    return latencies
+
+
+def persistent_publisher(messages, channels):
+    publisher = RabbitMQPublisher(channels=channels, buffer_size=messages)
+    publisher.start()
+    try:
+        started = []
+        futures = []
+        for index in range(messages):
+            started.append(time.perf_counter())
+            futures.append(publisher.publish(BENCH_QUEUE, sample_message(index)))
+        latencies = []
+        for start, future in zip(started, futures):
+            future.result(timeout=60)
+            latencies.append(time.perf_counter() - start)
+        return latencies
+    finally:
+        publisher.close()
+
+
+def report(name, messages, elapsed, latencies):
+    latencies = sorted(latencies)
+    p50 = statistics.median(latencies) * 1000
+    p99 = latencies[int(len(latencies) * 0.99) - 1] * 1000
+    print(f"{name:>12} {messages / elapsed:>10.1f} {p50:>10.2f} {p99:>10.2f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--messages", type=int, default=2000)
+    parser.add_argument("--channels", type=int, default=2, help="publisher channels for the persistent run")
+    args = parser.parse_args()
+
+    print(f"{'path':>12} {'msgs/s':>10} {'p50 ms':>10} {'p99 ms':>10}")
+    try:
+        for name, run in (
+            ("per-message", lambda: connect_per_message(args.messages)),
+            ("persistent", lambda: persistent_publisher(args.messages, args.channels)),
+        ):
+            start = time.perf_counter()
+            latencies = run()
+            report(name, args.messages, time.perf_counter() - start, latencies)
+    finally:
+        connection = get_connection()
+        connection.channel().queue_delete(queue=BENCH_QUEUE)
+        connection.close()
+
+
+if __name__ == "__main__":
+    main()
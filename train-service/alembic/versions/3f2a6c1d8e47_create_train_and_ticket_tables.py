@@ -0,0 +1,58 @@
+"""Create train and ticket tables
+
+Revision ID: 3f2a6c1d8e47
+Revises: b9b78770103f
+Create Date: 2026-10-18 10:12:41.208113
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '3f2a6c1d8e47'
+down_revision: Union[str, None] = 'b9b78770103f'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # The tables may already exist on databases bootstrapped by Base.metadata.create_all
+    inspector = sa.inspect(op.get_bind())
+
+    if not inspector.has_table('train'):
+        op.create_table(
+            'train',
+            sa.Column('id', sa.Integer(), nullable=False),
+            sa.Column('name', sa.String(length=50), nullable=True),
+            sa.Column('source', sa.String(length=50), nullable=True),
+            sa.Column('destination', sa.String(length=50), nullable=True),
+            sa.Column('departure_time', sa.DateTime(), nullable=True),
+            sa.PrimaryKeyConstraint('id')
+        )
+        op.create_index(op.f('ix_train_id'), 'train', ['id'], unique=False)
+        op.create_index(op.f('ix_train_name'), 'train', ['name'], unique=False)
+
+    if not inspector.has_table('ticket'):
+        op.create_table(
+            'ticket',
+            sa.Column('id', sa.Integer(), nullable=False),
+            sa.Column('train_id', sa.Integer(), nullable=True),
+            sa.Column('seat_number', sa.String(length=50), nullable=True),
+            sa.Column('price', sa.Float(), nullable=True),
+            sa.Column('status', sa.String(length=50), nullable=False),
+            sa.Column('buyer_id', sa.Integer(), nullable=True),
+            sa.ForeignKeyConstraint(['train_id'], ['train.id'], ondelete='CASCADE'),
+            sa.PrimaryKeyConstraint('id')
+        )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    # Intentionally a no-op: upgrade() only adopts tables that usually predate this
+    # migration (created by Base.metadata.create_all), so dropping them here would
+    # destroy live data. Drop ticket and train by hand if that is really wanted.
+    pass
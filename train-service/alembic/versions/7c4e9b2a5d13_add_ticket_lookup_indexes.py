@@ -0,0 +1,73 @@
+"""Add ticket lookup indexes and unique seat per train
+
+Revision ID: 7c4e9b2a5d13
+Revises: 3f2a6c1d8e47
+Create Date: 2026-10-18 10:31:05.774920
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '7c4e9b2a5d13'
+down_revision: Union[str, None] = '3f2a6c1d8e47'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+TICKET_INDEXES = ('uq_ticket_train_id_seat_number', 'ix_ticket_train_id_status', 'ix_ticket_train_id_available')
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Built CONCURRENTLY so large ticket tables stay writable; that can't run inside a transaction.
+    # Fails if a train already has duplicate seat numbers - clean those up first.
+    with op.get_context().autocommit_block():
+        # A failed or interrupted CONCURRENTLY build leaves an INVALID index behind, which
+        # if_not_exists would skip over; drop those so the build below starts clean.
+        invalid_indexes = op.get_bind().execute(
+            sa.text(
+                "SELECT index_class.relname FROM pg_index "
+                "JOIN pg_class index_class ON index_class.oid = pg_index.indexrelid "
+                "WHERE NOT pg_index.indisvalid AND index_class.relname IN :names"
+            ).bindparams(sa.bindparam('names', expanding=True)),
+            {'names': list(TICKET_INDEXES)},
+        ).scalars().all()
+        for index_name in invalid_indexes:
+            op.drop_index(index_name, table_name='ticket', postgresql_concurrently=True, if_exists=True)
+
+        # book_ticket / confirm_booking: WHERE train_id = ? AND seat_number = ?
+        op.create_index(
+            'uq_ticket_train_id_seat_number', 'ticket', ['train_id', 'seat_number'],
+            unique=True, postgresql_concurrently=True, if_not_exists=True
+        )
+        # availability counts and listings: WHERE train_id = ? AND status = ?
+        op.create_index(
+            'ix_ticket_train_id_status', 'ticket', ['train_id', 'status'],
+            postgresql_concurrently=True, if_not_exists=True
+        )
+        # next available seat: WHERE train_id = ? AND status = 'available' ORDER BY id
+        op.create_index(
+            'ix_ticket_train_id_available', 'ticket', ['train_id', 'id'],
+            postgresql_where=sa.text("status = 'available'"), postgresql_concurrently=True, if_not_exists=True
+        )
+
+    # Promote the unique index to a constraint (instant, reuses the index),
+    # unless create_all already created the constraint
+    inspector = sa.inspect(op.get_bind())
+    unique_constraints = {constraint['name'] for constraint in inspector.get_unique_constraints('ticket')}
+    if 'uq_ticket_train_id_seat_number' not in unique_constraints:
+        op.execute(
+            "ALTER TABLE ticket ADD CONSTRAINT uq_ticket_train_id_seat_number "
+            "UNIQUE USING INDEX uq_ticket_train_id_seat_number"
+        )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_constraint('uq_ticket_train_id_seat_number', 'ticket', type_='unique')
+    with op.get_context().autocommit_block():
+        op.drop_index('ix_ticket_train_id_available', table_name='ticket', postgresql_concurrently=True, if_exists=True)
+        op.drop_index('ix_ticket_train_id_status', table_name='ticket', postgresql_concurrently=True, if_exists=True)
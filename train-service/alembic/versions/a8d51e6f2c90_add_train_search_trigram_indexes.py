@@ -0,0 +1,40 @@
+"""Add trigram indexes for train search
+
+Revision ID: a8d51e6f2c90
+Revises: 7c4e9b2a5d13
+Create Date: 2026-10-18 11:04:52.316847
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a8d51e6f2c90'
+down_revision: Union[str, None] = '7c4e9b2a5d13'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+SEARCH_COLUMNS = ('name', 'source', 'destination')
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+
+    # GIN trigram indexes let ILIKE '%term%' and similarity() avoid a sequential scan
+    with op.get_context().autocommit_block():
+        for column in SEARCH_COLUMNS:
+            op.create_index(
+                f'ix_train_{column}_trgm', 'train', [column],
+                postgresql_using='gin', postgresql_ops={column: 'gin_trgm_ops'},
+                postgresql_concurrently=True, if_not_exists=True
+            )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.get_context().autocommit_block():
+        for column in SEARCH_COLUMNS:
+            op.drop_index(f'ix_train_{column}_trgm', table_name='train', postgresql_concurrently=True, if_exists=True)
@@ -0,0 +1,109 @@
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from fastapi.encoders import jsonable_encoder
+from redis.exceptions import RedisError
+
+from api.logger import logger
+from api.redis_client import redis_client
+from metrics import CATALOG_CACHE_HITS, CATALOG_CACHE_MISSES
+
+SEARCH_CACHE_SIZE = int(os.getenv("SEARCH_CACHE_SIZE", 1000))
+SEARCH_CACHE_TTL_SECONDS = float(os.getenv("SEARCH_CACHE_TTL_SECONDS", 30))
+CATALOG_CACHE_TTL_SECONDS = int(os.getenv("CATALOG_CACHE_TTL_SECONDS", 300))
+
+
+class TTLCache:
+    """
+    Bounded LRU cache whose entries expire after a fixed time-to-live
+    """
+
+    def __init__(self, max_size, ttl_seconds):
+        self.max_size = max_size
+        self.ttl_seconds = ttl_seconds
+        self._data = OrderedDict()  # key -> (expires_at, value)
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if expires_at <= time.monotonic():
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._data[key] = (time.monotonic() + self.ttl_seconds, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_size:
+                self._data.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+
+# Popular train search terms, keyed by (catalog version, term, limit, offset)
+search_cache = TTLCache(SEARCH_CACHE_SIZE, SEARCH_CACHE_TTL_SECONDS)
+
+
+class CatalogCache:
+    """
+    Read-through Redis cache for the train catalog.
+    Keys embed a catalog version; writers bump the version instead of
+    hunting down every key, and stale entries simply age out.
+    """
+
+    VERSION_KEY = "catalog:version"
+
+    def __init__(self, client, ttl_seconds):
+        self.client = client
+        self.ttl_seconds = ttl_seconds
+
+    def version(self):
+        try:
+            return self.client.get(self.VERSION_KEY) or "0"
+        except RedisError as e:
+            logger.error(f"Catalog cache unavailable: {e}")
+            return None
+
+    async def get_or_load(self, kind, key, loader, version=None):
+        version = version or self.version()
+        if version is None:
+            # Redis is down, serve straight from Postgres
+            return jsonable_encoder(await loader())
+
+        cache_key = f"catalog:v{version}:{kind}:{key}"
+        try:
+            cached = self.client.get(cache_key)
+        except RedisError as e:
+            logger.error(f"Catalog cache read failed: {e}")
+            cached = None
+        if cached is not None:
+            CATALOG_CACHE_HITS.labels(kind).inc()
+            return json.loads(cached)
+
+        CATALOG_CACHE_MISSES.labels(kind).inc()
+        value = jsonable_encoder(await loader())
+        try:
+            self.client.set(cache_key, json.dumps(value), ex=self.ttl_seconds)
+        except RedisError as e:
+            logger.error(f"Catalog cache write failed: {e}")
+        return value
+
+    def invalidate(self):
+        try:
+            self.client.incr(self.VERSION_KEY)
+        except RedisError as e:
+            logger.error(f"Catalog cache invalidation failed: {e}")
+
+
+catalog_cache = CatalogCache(redis_client, CATALOG_CACHE_TTL_SECONDS)
@@ -1,9 +1,11 @@
-from fastapi import APIRouter, Depends, HTTPException, Header
-from sqlalchemy.orm import Session
-from api.schema import TrainBase, TicketBase
+from fastapi import APIRouter, Depends, HTTPException, Header, Query, Request, Response
+from fastapi.responses import StreamingResponse
+from sqlalchemy.ext.asyncio import AsyncSession
+from api.schema import TrainBase, TicketBase, GroupBookingRequest, GroupConfirmRequest, TicketDetailsRequest
 from api import services
-from databaseConfig import get_db
-from typing import List
+from api.service_auth import verify_service_token
+from databaseConfig import get_async_db
+from typing import List, Optional
 
 # Add logging here if necessary
 
@@ -11,45 +13,126 @@ router = APIRouter()
 
 # Create Train
 @router.post("/train")
-async def create_train(train: TrainBase, db: Session = Depends(get_db)):
-    return services.create_train(train, db)
+async def create_train(train: TrainBase, db: AsyncSession = Depends(get_async_db)):
+    return await services.create_train(train, db)
 
-# Get Trains
+# Get Trains (keyset paginated, or streamed as NDJSON)
 @router.get("/train")
-async def get_trains(db: Session = Depends(get_db)):
-    return services.get_trains(db)
+async def get_trains(
+    response: Response,
+    after_id: Optional[int] = Query(None, ge=0),
+    limit: int = Query(100, ge=1, le=1000),
+    stream: bool = False,
+    db: AsyncSession = Depends(get_async_db)
+):
+    if stream:
+        return StreamingResponse(services.stream_trains(), media_type="application/x-ndjson")
+    trains, next_cursor = await services.get_trains(db, after_id, limit)
+    if next_cursor is not None:
+        response.headers["X-Next-Cursor"] = str(next_cursor)
+    return trains
 
 # Search Trains
 @router.get("/train/search")
-async def search_trains(term: str, db: Session = Depends(get_db)):
-    return services.search_trains(term, db)
+async def search_trains(
+    term: str,
+    limit: int = Query(20, ge=1, le=100),
+    offset: int = Query(0, ge=0),
+    db: AsyncSession = Depends(get_async_db),
+):
+    return await services.search_trains(term, db, limit, offset)
 
 # Get Train by ID
 @router.get("/train/{train_id}")
-async def get_train_by_id(train_id: int, db: Session = Depends(get_db)):
-    return services.get_train_by_id(train_id, db)
+async def get_train_by_id(train_id: int, db: AsyncSession = Depends(get_async_db)):
+    return await services.get_train_by_id(train_id, db)
 
 # Create Tickets for a train
 @router.post("/ticket") 
-async def create_tickets(tickets: List[TicketBase], db: Session = Depends(get_db)):
-    return services.create_tickets(tickets, db)
+async def create_tickets(tickets: List[TicketBase], bulk: bool = False, db: AsyncSession = Depends(get_async_db)):
+    if bulk:
+        return await services.create_tickets_bulk(tickets, db)
+    return await services.create_tickets(tickets, db)
 
-# Get available tickets for a train
+# Create Tickets from an NDJSON stream (one TicketBase per line)
+@router.post("/ticket/bulk")
+async def create_tickets_stream(request: Request, db: AsyncSession = Depends(get_async_db)):
+    return await services.create_tickets_stream(request.stream(), db)
+
+# Ticket + train details for many tickets at once (service-to-service only, needs the service credential)
+@router.post("/ticket/details", dependencies=[Depends(verify_service_token)])
+async def get_ticket_details(request: TicketDetailsRequest, db: AsyncSession = Depends(get_async_db)):
+    return await services.get_ticket_details(request, db)
+
+# Get available tickets for a train (keyset paginated, or streamed as NDJSON)
 @router.get("/ticket/{train_id}")
-async def get_available_tickets_for_train(train_id: int, db: Session = Depends(get_db)):
-    return services.get_available_tickets_for_train(train_id, db)
+async def get_available_tickets_for_train(
+    train_id: int,
+    response: Response,
+    after_id: Optional[int] = Query(None, ge=0),
+    limit: int = Query(100, ge=1, le=1000),
+    stream: bool = False,
+    db: AsyncSession = Depends(get_async_db)
+):
+    if stream:
+        return StreamingResponse(services.stream_available_tickets_for_train(train_id), media_type="application/x-ndjson")
+    tickets, next_cursor = await services.get_available_tickets_for_train(train_id, db, after_id, limit)
+    if next_cursor is not None:
+        response.headers["X-Next-Cursor"] = str(next_cursor)
+    return tickets
+
+# Seat availability counts for a train
+@router.get("/ticket/{train_id}/availability")
+async def get_seat_availability(train_id: int, db: AsyncSession = Depends(get_async_db)):
+    return await services.get_seat_availability(train_id, db)
+
+# Get the next available ticket for a train
+@router.get("/ticket/{train_id}/next-available")
+async def get_next_available_ticket(train_id: int, db: AsyncSession = Depends(get_async_db)):
+    return await services.get_next_available_ticket(train_id, db)
+
+# Get the status of a single ticket
+@router.get("/ticket/{train_id}/{ticket_id}/status")
+async def get_ticket_status(train_id: int, ticket_id: int, db: AsyncSession = Depends(get_async_db)):
+    return await services.get_ticket_status(train_id, ticket_id, db)
 
 # Book ticket
 @router.post("/ticket/book")
-async def book_ticket(train_id: int, seat_number: str, db: Session = Depends(get_db)):
-    return services.book_ticket(train_id, seat_number, db)
+async def book_ticket(train_id: int, seat_number: str, db: AsyncSession = Depends(get_async_db)):
+    return await services.book_ticket(train_id, seat_number, db)
+
+# Book several seats under one lock (all or nothing)
+@router.post("/ticket/book/group")
+async def book_ticket_group(booking: GroupBookingRequest, db: AsyncSession = Depends(get_async_db)):
+    return await services.book_ticket_group(booking, db)
+
+# Extend a seat lock
+@router.put("/ticket/extend")
+async def extend_booking(train_id: int, seat_number: str, lock_id: str):
+    return await services.extend_booking(train_id, seat_number, lock_id)
 
 # Confirm booking
 @router.put("/ticket/confirm")
-async def confirm_booking(train_id: int, seat_number: str, lock_id: str, db: Session = Depends(get_db), authorization: str = Header(None)):
+async def confirm_booking(
+    train_id: int,
+    seat_number: str,
+    lock_id: str,
+    db: AsyncSession = Depends(get_async_db),
+    authorization: str = Header(None),
+):
     if authorization is None or not authorization.startswith('Bearer '):
         raise HTTPException(status_code=401, detail="Bearer token missing or Invalid.") # this is technically redundant since nginx will handle
     bearer_token = authorization.split(' ')[1]
-    return services.confirm_booking(train_id, seat_number, lock_id, db, bearer_token)
-
+    return await services.confirm_booking(train_id, seat_number, lock_id, db, bearer_token)
 
+# Confirm group booking
+@router.put("/ticket/confirm/group")
+async def confirm_booking_group(
+    booking: GroupConfirmRequest,
+    db: AsyncSession = Depends(get_async_db),
+    authorization: str = Header(None),
+):
+    if authorization is None or not authorization.startswith('Bearer '):
+        raise HTTPException(status_code=401, detail="Bearer token missing or Invalid.")
+    bearer_token = authorization.split(' ')[1]
+    return await services.confirm_booking_group(booking, db, bearer_token)
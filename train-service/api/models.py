@@ -1,4 +1,4 @@
-from sqlalchemy import Column, DateTime, ForeignKey, Integer, String, Float
+from sqlalchemy import DDL, Column, DateTime, ForeignKey, Index, Integer, String, Float, UniqueConstraint, event, text
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 
@@ -12,6 +12,15 @@ class Train(Base):
     source = Column(String(50))
     destination = Column(String(50))
     departure_time = Column(DateTime, default=func.now())
+
+    # trigram indexes for /train/search (kept in sync with the alembic migrations)
+    __table_args__ = tuple(
+        Index(f'ix_train_{column}_trgm', column, postgresql_using='gin', postgresql_ops={column: 'gin_trgm_ops'})
+        for column in ('name', 'source', 'destination')
+    )
+
+# gin_trgm_ops needs the extension before create_all builds the indexes
+event.listen(Train.__table__, 'before_create', DDL("CREATE EXTENSION IF NOT EXISTS pg_trgm"))
     
 class Ticket(Base):
     __tablename__ = 'ticket'
@@ -24,4 +33,14 @@ class Ticket(Base):
     buyer_id = Column(Integer, nullable=True)
     
     train = relationship('Train')
+
+    # Kept in sync with the alembic migrations
+    __table_args__ = (
+        # one ticket per seat per train; also serves WHERE train_id = ? AND seat_number = ?
+        UniqueConstraint('train_id', 'seat_number', name='uq_ticket_train_id_seat_number'),
+        # availability lookups: WHERE train_id = ? AND status = ?
+        Index('ix_ticket_train_id_status', 'train_id', 'status'),
+        # next available seat: WHERE train_id = ? AND status = 'available' ORDER BY id
+        Index('ix_ticket_train_id_available', 'train_id', 'id', postgresql_where=text("status = 'available'")),
+    )
     
\ No newline at end of file
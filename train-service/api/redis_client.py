@@ -1,4 +1,5 @@
 import os
+import time
 import redis
 from fastapi import HTTPException
 import uuid
@@ -12,20 +13,226 @@ redis_client = redis.Redis(host=REDIS_HOST, port=REDIS_PORT, decode_responses=Tr
 # Constants
 LOCK_EXPIRATION_TIME = 600  # 10 minutes
 
-def lock_seat(train_id, seat_number: str) -> str:
-    key = f"seat:{train_id}:{seat_number}"
-    lock_id = str(uuid.uuid4())
+# Results of the compare-and-* scripts
+LOCK_MISSING = -1
+LOCK_MISMATCH = 0
+LOCK_OK = 1
 
-    acquired = redis_client.set(key, lock_id, ex=LOCK_EXPIRATION_TIME, nx=True)
-    if not acquired:
-        raise HTTPException(status_code=409, detail="Seat already locked")
+# Seat inventory bookkeeping shared by the lock scripts, so a lock and its
+# inventory update land in the same atomic call (key layout in api.seat_inventory).
+# inv = {idx, seats, free, booked, holds}; seats missing from an inventory that
+# has not been built yet are skipped, the next read builds it from scratch.
+INVENTORY_LUA = """
+local function inventory_hold(inv, seat, expires_at)
+    local index = redis.call('HGET', inv[1], seat)
+    if index then
+        redis.call('SETBIT', inv[3], index, 0)
+        redis.call('SETBIT', inv[4], index, 0)
+        redis.call('ZADD', inv[5], expires_at, index)
+    end
+end
+local function inventory_release(inv, seat, booked)
+    local index = redis.call('HGET', inv[1], seat)
+    if index then
+        redis.call('ZREM', inv[5], index)
+        if booked == '1' then
+            redis.call('SETBIT', inv[4], index, 1)
+        elseif redis.call('GETBIT', inv[4], index) == 0 then
+            redis.call('SETBIT', inv[3], index, 1)
+        end
+    end
+end
+"""
+
+# KEYS[1] lock key, KEYS[2] metadata key, KEYS[3..7] inventory keys
+# ARGV[1] lock id, ARGV[2] ttl in seconds, ARGV[3] seat number, ARGV[4] lock expiry (epoch seconds),
+# ARGV[5..] metadata field/value pairs
+ACQUIRE_SCRIPT = INVENTORY_LUA + """
+if not redis.call('SET', KEYS[1], ARGV[1], 'NX', 'EX', ARGV[2]) then
+    return 0
+end
+if #ARGV > 4 then
+    redis.call('HSET', KEYS[2], unpack(ARGV, 5))
+    redis.call('EXPIRE', KEYS[2], ARGV[2])
+end
+inventory_hold({KEYS[3], KEYS[4], KEYS[5], KEYS[6], KEYS[7]}, ARGV[3], ARGV[4])
+return 1
+"""
+
+# KEYS[1] lock key, KEYS[2] metadata key, KEYS[3..7] inventory keys
+# ARGV[1] lock id, ARGV[2] seat number, ARGV[3] '1' if the seat is being booked, '0' to free it
+# A seat held by a group lock can only be released through the group scripts
+RELEASE_SCRIPT = INVENTORY_LUA + """
+local current = redis.call('GET', KEYS[1])
+if not current then
+    return -1
+end
+if current ~= ARGV[1] or redis.call('HEXISTS', KEYS[2], 'group_size') == 1 then
+    return 0
+end
+redis.call('DEL', KEYS[1], KEYS[2])
+inventory_release({KEYS[3], KEYS[4], KEYS[5], KEYS[6], KEYS[7]}, ARGV[2], ARGV[3])
+return 1
+"""
+
+# KEYS[1] lock key, KEYS[2] metadata key, KEYS[3..7] inventory keys
+# ARGV[1] lock id, ARGV[2] ttl in seconds, ARGV[3] seat number, ARGV[4] new lock expiry (epoch seconds)
+EXTEND_SCRIPT = INVENTORY_LUA + """
+local current = redis.call('GET', KEYS[1])
+if not current then
+    return -1
+end
+if current ~= ARGV[1] or redis.call('HEXISTS', KEYS[2], 'group_size') == 1 then
+    return 0
+end
+redis.call('EXPIRE', KEYS[1], ARGV[2])
+redis.call('EXPIRE', KEYS[2], ARGV[2])
+inventory_hold({KEYS[3], KEYS[4], KEYS[5], KEYS[6], KEYS[7]}, ARGV[3], ARGV[4])
+return 1
+"""
+
+# KEYS[1] group key, KEYS[2..6] inventory keys, KEYS[7..n+6] lock keys, KEYS[n+7..2n+6] metadata keys
+# ARGV[1] group lock id, ARGV[2] ttl in seconds, ARGV[3] locked at, ARGV[4] lock expiry, ARGV[5..] seat numbers
+# Locks every seat or none and records the seat set under the group key.
+# Returns 0 on success, else the 1-based index of the first seat already locked
+GROUP_ACQUIRE_SCRIPT = INVENTORY_LUA + """
+local n = #ARGV - 4
+local inv = {KEYS[2], KEYS[3], KEYS[4], KEYS[5], KEYS[6]}
+for i = 1, n do
+    if redis.call('EXISTS', KEYS[6 + i]) == 1 then
+        return i
+    end
+end
+redis.call('DEL', KEYS[1])
+redis.call('SADD', KEYS[1], unpack(ARGV, 5))
+redis.call('EXPIRE', KEYS[1], ARGV[2])
+for i = 1, n do
+    redis.call('SET', KEYS[6 + i], ARGV[1], 'EX', ARGV[2])
+    redis.call('HSET', KEYS[6 + n + i], 'lock_id', ARGV[1], 'locked_at', ARGV[3], 'group_size', n)
+    redis.call('EXPIRE', KEYS[6 + n + i], ARGV[2])
+    inventory_hold(inv, ARGV[4 + i], ARGV[4])
+end
+return 0
+"""
+
+# KEYS[1] group key, KEYS[2..6] inventory keys, KEYS[7..n+6] lock keys, KEYS[n+7..2n+6] metadata keys
+# ARGV[1] group lock id, ARGV[2] '1' if the seats are being booked, '0' to free them, ARGV[3..] seat numbers
+# Releases the seats only if they are exactly the group's seat set and the group owns all of them
+GROUP_RELEASE_SCRIPT = INVENTORY_LUA + """
+local n = #ARGV - 2
+local values = redis.call('MGET', unpack(KEYS, 7, 6 + n))
+for i = 1, n do
+    if not values[i] then
+        return -1
+    end
+    if values[i] ~= ARGV[1] then
+        return 0
+    end
+end
+if redis.call('SCARD', KEYS[1]) ~= n then
+    return 0
+end
+for i = 1, n do
+    if redis.call('SISMEMBER', KEYS[1], ARGV[2 + i]) == 0 then
+        return 0
+    end
+end
+redis.call('DEL', KEYS[1], unpack(KEYS, 7))
+local inv = {KEYS[2], KEYS[3], KEYS[4], KEYS[5], KEYS[6]}
+for i = 1, n do
+    inventory_release(inv, ARGV[2 + i], ARGV[2])
+end
+return 1
+"""
+
+# Scripts are loaded once and then called by SHA (EVALSHA), one round trip each
+acquire_script = redis_client.register_script(ACQUIRE_SCRIPT)
+release_script = redis_client.register_script(RELEASE_SCRIPT)
+extend_script = redis_client.register_script(EXTEND_SCRIPT)
+group_acquire_script = redis_client.register_script(GROUP_ACQUIRE_SCRIPT)
+group_release_script = redis_client.register_script(GROUP_RELEASE_SCRIPT)
+
+def inventory_keys(train_id):
+    prefix = f"inv:{train_id}"
+    return [f"{prefix}:idx", f"{prefix}:seats", f"{prefix}:free", f"{prefix}:booked", f"{prefix}:holds"]
+
+def seat_keys(train_id, seat_number: str):
+    return [f"seat:{train_id}:{seat_number}", f"seatmeta:{train_id}:{seat_number}", *inventory_keys(train_id)]
+
+def lock_seat(train_id, seat_number: str, lock_id: str = None, **metadata) -> str:
+    """
+    Atomically lock a seat, store metadata about the holder alongside it and hold it in the inventory
+    """
+    lock_id = lock_id or str(uuid.uuid4())
+    now = int(time.time())
+    fields = {"lock_id": lock_id, "locked_at": now, **metadata}
+    args = [lock_id, LOCK_EXPIRATION_TIME, seat_number, now + LOCK_EXPIRATION_TIME]
+    for field, value in fields.items():
+        args.extend([field, str(value)])
+
+    if not acquire_script(keys=seat_keys(train_id, seat_number), args=args):
+        raise HTTPException(status_code=409, detail="Seat already locked. Please try again later.")
 
     return lock_id
 
-def unlock_seat(train_id, seat_number: str, lock_id: str) -> None:
-    key = f"seat:{train_id}:{seat_number}"
-    
-    # Ensures only the owner of the lock can release it
-    stored_lock_id = redis_client.get(key)
-    if stored_lock_id and stored_lock_id == lock_id:
-        redis_client.delete(key)
+def release_seat(train_id, seat_number: str, lock_id: str, book: bool = False) -> int:
+    """
+    Release a seat lock only if lock_id still owns it, marking the seat booked
+    (book=True) or free again in the inventory.
+    Returns LOCK_OK, LOCK_MISMATCH or LOCK_MISSING.
+    """
+    return release_script(keys=seat_keys(train_id, seat_number), args=[lock_id, seat_number, int(book)])
+
+def extend_seat_lock(train_id, seat_number: str, lock_id: str, ttl: int = LOCK_EXPIRATION_TIME) -> int:
+    """
+    Push back the expiry of a seat lock only if lock_id still owns it.
+    Returns LOCK_OK, LOCK_MISMATCH or LOCK_MISSING.
+    """
+    return extend_script(keys=seat_keys(train_id, seat_number), args=[lock_id, ttl, seat_number, int(time.time()) + ttl])
+
+def group_keys(train_id, seat_numbers, lock_id: str):
+    return [
+        f"seatgroup:{train_id}:{lock_id}",
+        *inventory_keys(train_id),
+        *[f"seat:{train_id}:{seat_number}" for seat_number in seat_numbers],
+        *[f"seatmeta:{train_id}:{seat_number}" for seat_number in seat_numbers],
+    ]
+
+def lock_seats(train_id, seat_numbers, lock_id: str = None) -> str:
+    """
+    Atomically lock a set of seats under one lock id, all or nothing, and hold them in the inventory
+    """
+    lock_id = lock_id or str(uuid.uuid4())
+    keys = group_keys(train_id, seat_numbers, lock_id)
+    now = int(time.time())
+
+    conflict = group_acquire_script(
+        keys=keys, args=[lock_id, LOCK_EXPIRATION_TIME, now, now + LOCK_EXPIRATION_TIME, *seat_numbers]
+    )
+    if conflict:
+        raise HTTPException(
+            status_code=409, detail=f"Seat {seat_numbers[conflict - 1]} already locked. Please try again later."
+        )
+
+    return lock_id
+
+def release_seats(train_id, seat_numbers, lock_id: str, book: bool = False) -> int:
+    """
+    Release a set of seats only if they are exactly the seats locked under lock_id,
+    marking them booked (book=True) or free again in the inventory.
+    Returns LOCK_OK, LOCK_MISMATCH or LOCK_MISSING.
+    """
+    keys = group_keys(train_id, seat_numbers, lock_id)
+    return group_release_script(keys=keys, args=[lock_id, int(book), *seat_numbers])
+
+def get_locked_seats(train_id, seat_numbers) -> set:
+    """
+    Resolve the lock state of many seats in a single MGET round trip
+    """
+    seat_numbers = list(seat_numbers)
+    if not seat_numbers:
+        return set()
+
+    keys = [f"seat:{train_id}:{seat_number}" for seat_number in seat_numbers]
+    values = redis_client.mget(keys)
+    return {seat_number for seat_number, value in zip(seat_numbers, values) if value is not None}
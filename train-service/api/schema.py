@@ -1,10 +1,12 @@
-from pydantic import BaseModel
+from pydantic import BaseModel, Field, field_validator
+from typing import List
+from datetime import datetime
 
 class TrainBase(BaseModel):
     name: str
     source: str
     destination: str
-    departure_time: str
+    departure_time: datetime
     
     class Config:
         from_attributes = True
@@ -15,4 +17,27 @@ class TicketBase(BaseModel):
     price: float
     
     class Config:
-        from_attributes = True
\ No newline at end of file
+        from_attributes = True
+
+# Seats per group booking
+GROUP_BOOKING_MAX_SEATS = 10
+
+class GroupBookingRequest(BaseModel):
+    train_id: int
+    seat_numbers: List[str] = Field(min_length=1, max_length=GROUP_BOOKING_MAX_SEATS)
+
+    @field_validator("seat_numbers")
+    @classmethod
+    def seats_must_be_unique(cls, seat_numbers):
+        if len(set(seat_numbers)) != len(seat_numbers):
+            raise ValueError("seat_numbers must not contain duplicates")
+        return seat_numbers
+
+class GroupConfirmRequest(GroupBookingRequest):
+    lock_id: str
+
+# Tickets per details lookup
+TICKET_DETAILS_MAX_IDS = 500
+
+class TicketDetailsRequest(BaseModel):
+    ticket_ids: List[int] = Field(min_length=1, max_length=TICKET_DETAILS_MAX_IDS)
@@ -0,0 +1,197 @@
+import os
+import time
+from collections import defaultdict
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from api.logger import logger
+from api.models import Ticket
+from api.redis_client import redis_client, inventory_keys
+
+# Per-train seat inventory kept in Redis as bitmaps, one bit per seat index:
+#   inv:{train_id}:idx    hash seat_number -> index
+#   inv:{train_id}:seats  hash index -> seat_number
+#   inv:{train_id}:free   bit set while the seat is neither locked nor booked
+#   inv:{train_id}:booked bit set once the seat is booked
+#   inv:{train_id}:holds  sorted set of locked seat indexes scored by lock expiry
+# A seat that is neither free nor booked is locked. The seat locks and the
+# ticket table stay authoritative; the inventory answers counts and
+# "first free seat" without touching Postgres. Locking, extending and
+# releasing a seat update the inventory inside the lock scripts
+# (api.redis_client). Drift the scripts can't see (a rebuild racing a
+# confirm, a booking made while no inventory existed) heals two ways: a stale
+# seat found by get_next_available_ticket is resynced on the spot, and the
+# inventory keys expire so each train is rebuilt from Postgres periodically.
+
+# Lifetime of a built inventory; the next read after it expires rebuilds it
+SEAT_INVENTORY_TTL_SECONDS = int(os.getenv("SEAT_INVENTORY_TTL_SECONDS", 3600))
+
+def rebuild_keys(train_id):
+    return [f"{key}:rebuild" for key in inventory_keys(train_id)]
+
+# KEYS[1..5] inventory keys, KEYS[6..10] temporary build keys, KEYS[11..n+10] seat lock keys
+# ARGV[1] now (epoch seconds), ARGV[2] inventory ttl in seconds,
+# ARGV[3..] seat_number/status pairs in the same order as the lock keys
+# Builds into the temporary keys and RENAMEs them over the live ones in the same call. Lock state is
+# read here rather than by the caller, so a seat locked while the ticket rows were loading stays held.
+# Bookings are never undone, so a seat the live inventory already has as booked stays booked even if
+# its row was read just before the confirm committed.
+REBUILD_SCRIPT = """
+redis.call('DEL', KEYS[6], KEYS[7], KEYS[8], KEYS[9], KEYS[10])
+local index = 0
+for i = 3, #ARGV, 2 do
+    local seat, status = ARGV[i], ARGV[i + 1]
+    redis.call('HSET', KEYS[6], seat, index)
+    redis.call('HSET', KEYS[7], index, seat)
+    local previous = redis.call('HGET', KEYS[1], seat)
+    if previous and redis.call('GETBIT', KEYS[4], previous) == 1 then
+        status = 'booked'
+    end
+    if status == 'booked' then
+        redis.call('SETBIT', KEYS[9], index, 1)
+    else
+        local ttl = redis.call('TTL', KEYS[11 + index])
+        if ttl > 0 then
+            redis.call('ZADD', KEYS[10], ARGV[1] + ttl, index)
+        else
+            redis.call('SETBIT', KEYS[8], index, 1)
+        end
+    end
+    index = index + 1
+end
+for i = 1, 5 do
+    if redis.call('EXISTS', KEYS[5 + i]) == 1 then
+        redis.call('RENAME', KEYS[5 + i], KEYS[i])
+        redis.call('EXPIREAT', KEYS[i], ARGV[1] + ARGV[2])
+    else
+        redis.call('DEL', KEYS[i])
+    end
+end
+return index
+"""
+
+# KEYS[1..5] inventory keys, KEYS[6] seat lock key; ARGV[1] now, ARGV[2] seat number, ARGV[3] ticket status
+# Recomputes one seat's bits from its ticket row and lock, same rules as a rebuild
+RESYNC_SCRIPT = """
+local index = redis.call('HGET', KEYS[1], ARGV[2])
+if not index then
+    return 0
+end
+local ttl = redis.call('TTL', KEYS[6])
+redis.call('ZREM', KEYS[5], index)
+if ARGV[3] == 'booked' then
+    redis.call('SETBIT', KEYS[3], index, 0)
+    redis.call('SETBIT', KEYS[4], index, 1)
+elseif ttl > 0 then
+    redis.call('SETBIT', KEYS[3], index, 0)
+    redis.call('SETBIT', KEYS[4], index, 0)
+    redis.call('ZADD', KEYS[5], ARGV[1] + ttl, index)
+else
+    redis.call('SETBIT', KEYS[3], index, 1)
+    redis.call('SETBIT', KEYS[4], index, 0)
+end
+return 1
+"""
+
+# KEYS inventory keys; ARGV[1..n] new seat numbers
+# Only extends an inventory that has already been built; otherwise the next read builds it
+ADD_SCRIPT = """
+if redis.call('EXISTS', KEYS[1]) == 0 then
+    return 0
+end
+local added = 0
+for _, seat in ipairs(ARGV) do
+    if redis.call('HEXISTS', KEYS[1], seat) == 0 then
+        local index = redis.call('HLEN', KEYS[1])
+        redis.call('HSET', KEYS[1], seat, index)
+        redis.call('HSET', KEYS[2], index, seat)
+        redis.call('SETBIT', KEYS[3], index, 1)
+        added = added + 1
+    end
+end
+return added
+"""
+
+# KEYS inventory keys; ARGV[1] now (epoch seconds)
+# Frees every hold whose lock has expired, unless the seat got booked meanwhile
+REAP_SCRIPT = """
+local expired = redis.call('ZRANGEBYSCORE', KEYS[5], '-inf', ARGV[1])
+for _, index in ipairs(expired) do
+    if redis.call('GETBIT', KEYS[4], index) == 0 then
+        redis.call('SETBIT', KEYS[3], index, 1)
+    end
+end
+if #expired > 0 then
+    redis.call('ZREM', KEYS[5], unpack(expired))
+end
+return #expired
+"""
+
+rebuild_script = redis_client.register_script(REBUILD_SCRIPT)
+add_script = redis_client.register_script(ADD_SCRIPT)
+reap_script = redis_client.register_script(REAP_SCRIPT)
+resync_script = redis_client.register_script(RESYNC_SCRIPT)
+
+async def rebuild_inventory(train_id: int, db: AsyncSession) -> int:
+    """
+    Build the inventory for a train from the ticket table and the current seat locks
+    """
+    result = await db.execute(
+        select(Ticket.seat_number, Ticket.status).where(Ticket.train_id == train_id).order_by(Ticket.id)
+    )
+    rows = result.all()
+
+    keys = inventory_keys(train_id) + rebuild_keys(train_id)
+    args = [int(time.time()), SEAT_INVENTORY_TTL_SECONDS]
+    for seat_number, status in rows:
+        keys.append(f"seat:{train_id}:{seat_number}")
+        args.extend([seat_number, status])
+
+    seats = rebuild_script(keys=keys, args=args)
+    logger.info(f"Rebuilt seat inventory for train {train_id} with {seats} seats")
+    return seats
+
+def add_seats(tickets) -> None:
+    """
+    Register newly created (available) tickets with their trains' inventories
+    """
+    seats_by_train = defaultdict(list)
+    for ticket in tickets:
+        seats_by_train[ticket.train_id].append(ticket.seat_number)
+    for train_id, seat_numbers in seats_by_train.items():
+        add_script(keys=inventory_keys(train_id), args=seat_numbers)
+
+def resync_seat(train_id, seat_number: str, status: str) -> None:
+    """
+    Correct one seat's inventory bits from its ticket status and current lock
+    """
+    keys = inventory_keys(train_id) + [f"seat:{train_id}:{seat_number}"]
+    resync_script(keys=keys, args=[int(time.time()), seat_number, status])
+
+async def get_inventory(train_id: int, db: AsyncSession) -> dict:
+    """
+    Availability counts and the first free seat for a train, from the bitmaps
+    """
+    keys = inventory_keys(train_id)
+    if not redis_client.exists(keys[0]):
+        await rebuild_inventory(train_id, db)
+
+    # expired locks are folded back in before reading
+    reap_script(keys=keys, args=[int(time.time())])
+
+    pipe = redis_client.pipeline(transaction=False)
+    pipe.hlen(keys[0])
+    pipe.bitcount(keys[2])
+    pipe.bitcount(keys[3])
+    pipe.bitpos(keys[2], 1)
+    total, available, booked, first_free = pipe.execute()
+
+    first_free_seat = redis_client.hget(keys[1], first_free) if first_free >= 0 else None
+
+    return {
+        "train_id": train_id,
+        "total": total,
+        "available": available,
+        "locked": total - available - booked,
+        "booked": booked,
+        "first_free_seat": first_free_seat
+    }
@@ -1,19 +1,40 @@
 from fastapi import HTTPException
+from fastapi.encoders import jsonable_encoder
 from api.logger import logger
-from sqlalchemy.orm import Session
+from sqlalchemy import case, func, insert, or_, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
 from api.models import Train, Ticket
-from api.schema import TrainBase, TicketBase
-from api.redis_client import redis_client, lock_seat, unlock_seat
-from typing import List
+from api.schema import TrainBase, TicketBase, GroupBookingRequest, GroupConfirmRequest, TicketDetailsRequest
+from api.token_verifier import verify_token
+from api.cache import search_cache, catalog_cache
+from api.seat_inventory import add_seats, get_inventory, rebuild_inventory, resync_seat
+from api.redis_client import (
+    lock_seat,
+    release_seat,
+    extend_seat_lock,
+    lock_seats,
+    release_seats,
+    get_locked_seats,
+    LOCK_MISSING,
+    LOCK_MISMATCH,
+)
+from databaseConfig import AsyncSessionLocal
+from typing import AsyncIterator, List, Optional
 
+import json
 import os
-import requests
 
-# For sync calls to auth service
-NGINX_HOST = os.getenv("NGINX_HOST", "localhost")
+# Rows per INSERT statement when bulk loading a seat map
+TICKET_BULK_CHUNK_SIZE = int(os.getenv("TICKET_BULK_CHUNK_SIZE", 1000))
+
+# Tickets fetched per query while looking for the next unlocked seat
+NEXT_AVAILABLE_PAGE_SIZE = 50
+
+# Rows fetched per round trip from the server-side cursor when streaming
+STREAM_BATCH_SIZE = int(os.getenv("STREAM_BATCH_SIZE", 500))
 
 # Create Train
-def create_train(train: TrainBase, db: Session):
+async def create_train(train: TrainBase, db: AsyncSession):
     db_train = Train(
         name=train.name,
         source=train.source,
@@ -21,36 +42,90 @@ def create_train(train: TrainBase, db: Session):
         departure_time=train.departure_time
     )
     db.add(db_train)
-    db.commit()
-    db.refresh(db_train)
+    await db.commit()
+    await db.refresh(db_train)
+    catalog_cache.invalidate()
+    search_cache.clear()
     logger.info(f"Train {db_train.name} created")
     return db_train
 
-# Get Trains
-def get_trains(db: Session):
-    logger.info("Fetching all trains")
-    return db.query(Train).all()
+# Get Trains, one keyset page at a time
+async def get_trains(db: AsyncSession, after_id: Optional[int] = None, limit: int = 100):
+    logger.info(f"Fetching trains after id {after_id}")
+
+    async def load_page():
+        query = select(Train).order_by(Train.id).limit(limit)
+        if after_id is not None:
+            query = query.where(Train.id > after_id)
+        result = await db.execute(query)
+        trains = result.scalars().all()
+        next_cursor = trains[-1].id if len(trains) == limit else None
+        return {"trains": trains, "next_cursor": next_cursor}
+
+    page = await catalog_cache.get_or_load("trains", f"{after_id}:{limit}", load_page)
+    return page["trains"], page["next_cursor"]
+
+# Stream all Trains as NDJSON from a server-side cursor
+async def stream_trains():
+    logger.info("Streaming all trains")
+    # The request's session is closed before a streaming body is sent, so use our own
+    async with AsyncSessionLocal() as db:
+        result = await db.stream_scalars(select(Train).order_by(Train.id).execution_options(yield_per=STREAM_BATCH_SIZE))
+        async for train in result:
+            yield json.dumps(jsonable_encoder(train)) + "\n"
 
 # Search Trains
-def search_trains(term: str, db: Session):
+async def search_trains(term: str, db: AsyncSession, limit: int = 20, offset: int = 0):
     logger.info(f"Searching trains with term {term}")
-    query = db.query(Train).filter(
-        Train.name.ilike(f"%{term}%") | 
-        Train.source.ilike(f"%{term}%") | 
-        Train.destination.ilike(f"%{term}%")
+    term = term.strip()
+    version = catalog_cache.version()
+    cache_key = (version, term.lower(), limit, offset)
+    cached = search_cache.get(cache_key)
+    if cached is not None:
+        return cached
+
+    async def load_results():
+        return await _search_trains_query(term, db, limit, offset)
+
+    trains = await catalog_cache.get_or_load("search", f"{term.lower()}:{limit}:{offset}", load_results, version)
+    search_cache.set(cache_key, trains)
+    return trains
+
+# Ranked trigram search against Postgres
+async def _search_trains_query(term: str, db: AsyncSession, limit: int, offset: int):
+
+    # ILIKE '%term%' is served by the pg_trgm GIN indexes on each column
+    escaped = term.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+    contains = f"%{escaped}%"
+    prefix = f"{escaped}%"
+    columns = (Train.name, Train.source, Train.destination)
+
+    # Rank prefix matches first, then by best trigram similarity across the columns
+    prefix_match = case((or_(*[column.ilike(prefix, escape="\\") for column in columns]), 1), else_=0)
+    similarity = func.greatest(*[func.similarity(column, term) for column in columns])
+    query = (
+        select(Train)
+        .where(or_(*[column.ilike(contains, escape="\\") for column in columns]))
+        .order_by(prefix_match.desc(), similarity.desc(), Train.id)
+        .limit(limit)
+        .offset(offset)
     )
-    return query.all()
+    result = await db.execute(query)
+    return result.scalars().all()
 
 # Get Train by ID
-def get_train_by_id(train_id: int, db: Session):
-    train = db.query(Train).filter(Train.id == train_id).first()
-    if not train:
-        logger.exception(f"Train with id {train_id} not found")
-        raise HTTPException(status_code=404, detail="Train not found")
-    return train
+async def get_train_by_id(train_id: int, db: AsyncSession):
+    async def load_train():
+        train = await db.get(Train, train_id)
+        if not train:
+            logger.exception(f"Train with id {train_id} not found")
+            raise HTTPException(status_code=404, detail="Train not found")
+        return train
+
+    return await catalog_cache.get_or_load("train", train_id, load_train)
 
 # Create Tickets for a Train
-def create_tickets(tickets: List[TicketBase], db: Session):
+async def create_tickets(tickets: List[TicketBase], db: AsyncSession):
     for ticket in tickets:
         db_ticket = Ticket(
             train_id=ticket.train_id,
@@ -58,84 +133,356 @@ def create_tickets(tickets: List[TicketBase], db: Session):
             price=ticket.price
         )
         db.add(db_ticket)
-        db.commit()
-        db.refresh(db_ticket)
+        await db.commit()
+        await db.refresh(db_ticket)
         logger.info(f"Ticket {db_ticket.id} created for train {db_ticket.train_id}")
+    add_seats(tickets)
+    catalog_cache.invalidate()
     return tickets
 
-# Retrieve available tickets for a train
-def get_available_tickets_for_train(train_id: int, db: Session):
-    tickets = db.query(Ticket).filter(Ticket.train_id == train_id, Ticket.status == 'available').all()
+# Insert one chunk of tickets, returning the generated ids in input order
+async def _insert_ticket_chunk(chunk: List[TicketBase], db: AsyncSession):
+    rows = [
+        {"train_id": ticket.train_id, "seat_number": ticket.seat_number, "price": ticket.price}
+        for ticket in chunk
+    ]
+    result = await db.execute(insert(Ticket).returning(Ticket.id, sort_by_parameter_order=True), rows)
+    return result.scalars().all()
+
+# Bulk create tickets in a single transaction
+async def create_tickets_bulk(tickets: List[TicketBase], db: AsyncSession):
+    ticket_ids = []
+    try:
+        for start in range(0, len(tickets), TICKET_BULK_CHUNK_SIZE):
+            ticket_ids.extend(await _insert_ticket_chunk(tickets[start:start + TICKET_BULK_CHUNK_SIZE], db))
+        await db.commit()
+    except Exception as e:
+        await db.rollback()
+        logger.error(f"Bulk ticket creation failed: {e}")
+        raise HTTPException(status_code=400, detail="Bulk ticket creation failed")
+
+    add_seats(tickets)
+    catalog_cache.invalidate()
+    logger.info(f"Bulk created {len(ticket_ids)} tickets")
+    return {"created": len(ticket_ids), "ids": ticket_ids}
+
+# Bulk create tickets from an NDJSON body, inserting chunk by chunk as it arrives
+async def create_tickets_stream(body: AsyncIterator[bytes], db: AsyncSession):
+    ticket_ids = []
+    created = []
+    chunk = []
+    buffer = b""
+    try:
+        async for data in body:
+            buffer += data
+            *lines, buffer = buffer.split(b"\n")
+            for line in lines:
+                if line.strip():
+                    chunk.append(TicketBase.model_validate_json(line))
+                if len(chunk) >= TICKET_BULK_CHUNK_SIZE:
+                    ticket_ids.extend(await _insert_ticket_chunk(chunk, db))
+                    created.extend(chunk)
+                    chunk = []
+        if buffer.strip():
+            chunk.append(TicketBase.model_validate_json(buffer))
+        if chunk:
+            ticket_ids.extend(await _insert_ticket_chunk(chunk, db))
+            created.extend(chunk)
+        await db.commit()
+    except Exception as e:
+        await db.rollback()
+        logger.error(f"Streamed ticket creation failed: {e}")
+        raise HTTPException(status_code=400, detail="Streamed ticket creation failed")
+
+    add_seats(created)
+    catalog_cache.invalidate()
+    logger.info(f"Stream created {len(ticket_ids)} tickets")
+    return {"created": len(ticket_ids), "ids": ticket_ids}
+
+# Retrieve available tickets for a train, one keyset page at a time
+async def get_available_tickets_for_train(train_id: int, db: AsyncSession, after_id: Optional[int] = None, limit: int = 100):
+    query = (
+        select(Ticket)
+        .where(Ticket.train_id == train_id, Ticket.status == 'available')
+        .order_by(Ticket.id)
+        .limit(limit)
+    )
+    if after_id is not None:
+        query = query.where(Ticket.id > after_id)
+    result = await db.execute(query)
+    tickets = result.scalars().all()
     
-    # remove the locked ones.
-    available_tickets = []
-    for ticket in tickets:
-        key = f"seat:{train_id}:{ticket.seat_number}"
-        if not redis_client.exists(key):
-            available_tickets.append(ticket)
+    # remove the locked ones (one redis round trip for the whole page).
+    locked_seats = get_locked_seats(train_id, [ticket.seat_number for ticket in tickets])
+    available_tickets = [ticket for ticket in tickets if ticket.seat_number not in locked_seats]
+
+    # the cursor follows the scanned rows, so locked seats don't end the walk early
+    next_cursor = tickets[-1].id if len(tickets) == limit else None
 
     logger.info(f"Found {len(available_tickets)} available tickets for train {train_id}")         
-    return available_tickets
+    return available_tickets, next_cursor
+
+# Stream all available tickets for a train as NDJSON from a server-side cursor
+async def stream_available_tickets_for_train(train_id: int):
+    logger.info(f"Streaming available tickets for train {train_id}")
+    async with AsyncSessionLocal() as db:
+        result = await db.stream_scalars(
+            select(Ticket)
+            .where(Ticket.train_id == train_id, Ticket.status == 'available')
+            .order_by(Ticket.id)
+            .execution_options(yield_per=STREAM_BATCH_SIZE)
+        )
+        async for tickets in result.partitions():
+            locked_seats = get_locked_seats(train_id, [ticket.seat_number for ticket in tickets])
+            for ticket in tickets:
+                if ticket.seat_number not in locked_seats:
+                    yield json.dumps(jsonable_encoder(ticket)) + "\n"
+
+# Seat availability counts for a train, served from the Redis seat inventory
+async def get_seat_availability(train_id: int, db: AsyncSession):
+    return await get_inventory(train_id, db)
+
+# Get the first available (unlocked) ticket for a train
+async def get_next_available_ticket(train_id: int, db: AsyncSession):
+    # the seat inventory points straight at the first free seat
+    inventory = await get_inventory(train_id, db)
+    if inventory["first_free_seat"] is None:
+        logger.error(f"No available tickets for train {train_id}")
+        raise HTTPException(status_code=404, detail="No available tickets for this train")
+
+    ticket = await get_ticket_by_seat(train_id, inventory["first_free_seat"], db)
+    if ticket and ticket.status == 'available' and not get_locked_seats(train_id, [ticket.seat_number]):
+        return ticket
+
+    # the hint was stale: fix it so later calls don't pay the same scan, then fall back to scanning
+    if ticket is None:
+        await rebuild_inventory(train_id, db)
+    else:
+        resync_seat(train_id, ticket.seat_number, ticket.status)
+    last_id = 0
+    while True:
+        # walk the (train_id, status) index in small pages until an unlocked seat turns up
+        result = await db.execute(
+            select(Ticket)
+            .where(Ticket.train_id == train_id, Ticket.status == 'available', Ticket.id > last_id)
+            .order_by(Ticket.id)
+            .limit(NEXT_AVAILABLE_PAGE_SIZE)
+        )
+        tickets = result.scalars().all()
+        if not tickets:
+            logger.error(f"No available tickets for train {train_id}")
+            raise HTTPException(status_code=404, detail="No available tickets for this train")
+
+        locked_seats = get_locked_seats(train_id, [ticket.seat_number for ticket in tickets])
+        for ticket in tickets:
+            if ticket.seat_number not in locked_seats:
+                return ticket
+        last_id = tickets[-1].id
+
+# Get the status of a single ticket on a train
+async def get_ticket_status(train_id: int, ticket_id: int, db: AsyncSession):
+    result = await db.execute(select(Ticket).where(Ticket.id == ticket_id, Ticket.train_id == train_id))
+    ticket = result.scalars().first()
+    if not ticket:
+        logger.error(f"Ticket {ticket_id} not found for train {train_id}")
+        raise HTTPException(status_code=404, detail="Ticket not found")
+
+    status = ticket.status
+    if status == 'available' and get_locked_seats(train_id, [ticket.seat_number]):
+        status = 'locked'
+
+    return {
+        "id": ticket.id,
+        "train_id": ticket.train_id,
+        "seat_number": ticket.seat_number,
+        "price": ticket.price,
+        "status": status
+    }
+
+# Get a ticket by its seat on a train
+async def get_ticket_by_seat(train_id: int, seat_number: str, db: AsyncSession):
+    result = await db.execute(select(Ticket).where(Ticket.train_id == train_id, Ticket.seat_number == seat_number))
+    return result.scalars().first()
 
 # Book a ticket
-def book_ticket(train_id: int, seat_number: str, db: Session):
-    ticket = db.query(Ticket).filter(Ticket.train_id == train_id, Ticket.seat_number == seat_number).first()
+async def book_ticket(train_id: int, seat_number: str, db: AsyncSession):
+    ticket = await get_ticket_by_seat(train_id, seat_number, db)
     if not ticket:
         # logger.exception(f"Ticket with seat number {seat_number} not found for train {train_id}")
         logger.error(f"Ticket with seat number {seat_number} not found for train {train_id}")
         raise HTTPException(status_code=404, detail="Ticket not found")
+
+    if ticket.status != 'available':
+        logger.error(f"Seat {seat_number} already booked for train {train_id}")
+        raise HTTPException(status_code=409, detail="Seat already booked.")
     
-    key = f"seat:{train_id}:{seat_number}"
-    if redis_client.exists(key):
+    # check-and-lock in a single atomic redis call
+    try:
+        lock_id = lock_seat(train_id, seat_number, ticket_id=ticket.id)
+    except HTTPException:
         # logger.exception(f"Seat {seat_number} already locked for train {train_id}")
         logger.error(f"Seat {seat_number} already locked for train {train_id}")
-        raise HTTPException(status_code=409, detail="Seat already locked. Please try again later.")
-    lock_id = lock_seat(train_id, seat_number)
+        raise
     
     logger.info(f"Ticket {ticket.id} booked for train {train_id}")
     
     return lock_id
 
+# Extend the hold on a locked seat (e.g. while payment is in progress)
+async def extend_booking(train_id: int, seat_number: str, lock_id: str):
+    extended = extend_seat_lock(train_id, seat_number, lock_id)
+    if extended == LOCK_MISSING:
+        logger.error(f"Seat {seat_number} not locked for train {train_id}")
+        raise HTTPException(status_code=409, detail="Seat not locked. Please try again later.")
+    if extended == LOCK_MISMATCH:
+        logger.error(f"Lock id mismatch for seat {seat_number} in train {train_id}")
+        raise HTTPException(status_code=409, detail="Lock id mismatch. Please try again later.")
+    
+    logger.info(f"Lock on seat {seat_number} extended for train {train_id}")
+    return lock_id
+
 # Confirm booking.
-def confirm_booking(train_id: int, seat_number: str, lock_id: str, db: Session, bearer_token: str):
-    ticket = db.query(Ticket).filter(Ticket.train_id == train_id, Ticket.seat_number == seat_number).first()
+async def confirm_booking(train_id: int, seat_number: str, lock_id: str, db: AsyncSession, bearer_token: str):
+    ticket = await get_ticket_by_seat(train_id, seat_number, db)
     if not ticket:
         # logger.exception(f"Ticket with seat number {seat_number} not found for train {train_id}")
         logger.error(f"Ticket with seat number {seat_number} not found for train {train_id}")
         raise HTTPException(status_code=404, detail="Ticket not found")
     
-    key = f"seat:{train_id}:{seat_number}"
-    stored_lock_id = redis_client.get(key)
-    if not stored_lock_id:
+    user_id = (await verify_token(bearer_token))["id"]
+    
+    # compare-and-release in one atomic redis call; the lock is restored if the DB write fails
+    released = release_seat(train_id, seat_number, lock_id, book=True)
+    if released == LOCK_MISSING:
         # logger.exception(f"Seat {seat_number} not locked for train {train_id}")
         logger.error(f"Seat {seat_number} not locked for train {train_id}")
         raise HTTPException(status_code=409, detail="Seat not locked. Please try again later.")
     
-    if stored_lock_id != lock_id:
+    if released == LOCK_MISMATCH:
         # logger.exception(f"Lock id mismatch for seat {seat_number} in train {train_id}")
         logger.error(f"Lock id mismatch for seat {seat_number} in train {train_id}")
         raise HTTPException(status_code=409, detail="Lock id mismatch. Please try again later.")
     
-    endpoint = f"http://{NGINX_HOST}/verify-token"
-    headers = {
-        "Authorization": f"Bearer {bearer_token}"
-    }
-    
     try:
-        response = requests.get(endpoint, headers=headers)
-        response.raise_for_status()
-        user_id = response.json().get('id')
+        result = await db.execute(
+            update(Ticket)
+            .where(Ticket.id == ticket.id, Ticket.status == 'available')
+            .values(buyer_id=user_id, status='booked')
+            .returning(Ticket)
+            .execution_options(synchronize_session=False)
+        )
+        booked_ticket = result.scalars().first()
+        await db.commit()
     except Exception as e:
-        logger.error(f"Error verifying token: {e}")
-        raise HTTPException(status_code=500, detail="Internal server error while verifying token with auth service")
-    
-    ticket.buyer_id = user_id
-    ticket.status = 'booked'
-    db.commit()
-    db.refresh(ticket)
+        await db.rollback()
+        try:
+            lock_seat(train_id, seat_number, lock_id=lock_id, ticket_id=ticket.id)
+        except HTTPException:
+            logger.error(f"Could not restore lock on seat {seat_number} for train {train_id}")
+        logger.error(f"Failed to confirm ticket {ticket.id} for train {train_id}: {e}")
+        raise HTTPException(status_code=500, detail="Internal server error while confirming booking")
     
-    unlock_seat(train_id, seat_number, lock_id)
+    if booked_ticket is None:
+        logger.error(f"Ticket {ticket.id} already booked for train {train_id}")
+        raise HTTPException(status_code=409, detail="Seat already booked.")
     
     logger.info(f"Ticket {ticket.id} confirmed for train {train_id}")
     
-    return ticket
\ No newline at end of file
+    return booked_ticket
+
+async def get_tickets_by_seats(train_id: int, seat_numbers: List[str], db: AsyncSession):
+    result = await db.execute(select(Ticket).where(Ticket.train_id == train_id, Ticket.seat_number.in_(seat_numbers)))
+    return result.scalars().all()
+
+# Book several seats at once; either every seat is locked under one lock id or none is
+async def book_ticket_group(booking: GroupBookingRequest, db: AsyncSession):
+    train_id, seat_numbers = booking.train_id, booking.seat_numbers
+    tickets = await get_tickets_by_seats(train_id, seat_numbers, db)
+
+    missing = set(seat_numbers) - {ticket.seat_number for ticket in tickets}
+    if missing:
+        logger.error(f"Tickets with seat numbers {sorted(missing)} not found for train {train_id}")
+        raise HTTPException(status_code=404, detail=f"Tickets not found for seats: {', '.join(sorted(missing))}")
+
+    booked = [ticket.seat_number for ticket in tickets if ticket.status != 'available']
+    if booked:
+        logger.error(f"Seats {booked} already booked for train {train_id}")
+        raise HTTPException(status_code=409, detail=f"Seats already booked: {', '.join(booked)}")
+
+    try:
+        lock_id = lock_seats(train_id, seat_numbers)
+    except HTTPException as e:
+        logger.error(f"Group lock failed for train {train_id}: {e.detail}")
+        raise
+
+    logger.info(f"Seats {seat_numbers} booked as a group for train {train_id}")
+
+    return {"lock_id": lock_id, "train_id": train_id, "seat_numbers": seat_numbers}
+
+# Confirm a group booking; all seats are written in a single transaction
+async def confirm_booking_group(booking: GroupConfirmRequest, db: AsyncSession, bearer_token: str):
+    train_id, seat_numbers, lock_id = booking.train_id, booking.seat_numbers, booking.lock_id
+
+    user_id = (await verify_token(bearer_token))["id"]
+
+    released = release_seats(train_id, seat_numbers, lock_id, book=True)
+    if released == LOCK_MISSING:
+        logger.error(f"Seats {seat_numbers} not locked for train {train_id}")
+        raise HTTPException(status_code=409, detail="Seats not locked. Please try again later.")
+
+    if released == LOCK_MISMATCH:
+        logger.error(f"Lock id mismatch for seats {seat_numbers} in train {train_id}")
+        raise HTTPException(status_code=409, detail="Lock id mismatch. Please try again later.")
+
+    try:
+        result = await db.execute(
+            update(Ticket)
+            .where(Ticket.train_id == train_id, Ticket.seat_number.in_(seat_numbers), Ticket.status == 'available')
+            .values(buyer_id=user_id, status='booked')
+            .returning(Ticket)
+            .execution_options(synchronize_session=False)
+        )
+        booked_tickets = result.scalars().all()
+        # all or nothing: a partial update means some seat was booked elsewhere
+        if len(booked_tickets) != len(seat_numbers):
+            await db.rollback()
+        else:
+            await db.commit()
+    except Exception as e:
+        await db.rollback()
+        try:
+            lock_seats(train_id, seat_numbers, lock_id=lock_id)
+        except HTTPException:
+            logger.error(f"Could not restore group lock on seats {seat_numbers} for train {train_id}")
+        logger.error(f"Failed to confirm seats {seat_numbers} for train {train_id}: {e}")
+        raise HTTPException(status_code=500, detail="Internal server error while confirming booking")
+
+    if len(booked_tickets) != len(seat_numbers):
+        # the release marked every seat booked; only some are, so resync from the ticket table
+        await rebuild_inventory(train_id, db)
+        logger.error(f"Some of seats {seat_numbers} already booked for train {train_id}")
+        raise HTTPException(status_code=409, detail="Seats already booked.")
+
+    logger.info(f"Seats {seat_numbers} confirmed for train {train_id}")
+
+    return booked_tickets
+
+# Ticket, seat and train details for many tickets in one query (used by notification-service)
+async def get_ticket_details(request: TicketDetailsRequest, db: AsyncSession):
+    result = await db.execute(
+        select(Ticket, Train)
+        .join(Train, Ticket.train_id == Train.id)
+        .where(Ticket.id.in_(set(request.ticket_ids)))
+    )
+    details = [
+        {
+            "ticket_id": ticket.id,
+            "seat_number": ticket.seat_number,
+            "price": ticket.price,
+            "status": ticket.status,
+            "train": jsonable_encoder(train)
+        }
+        for ticket, train in result.all()
+    ]
+    logger.info(f"Found details for {len(details)} of {len(request.ticket_ids)} tickets")
+    return details
@@ -8,6 +8,7 @@ from api.logger import logger
 import api.models as models
 
 from metrics import setup_metrics # importing metrics setup
+from api.service_client import close_service_clients
 
 app = FastAPI(openapi_url="/train/openapi.json", docs_url="/train/docs")
 
@@ -18,6 +19,9 @@ models.Base.metadata.create_all(bind=engine)
 
 app.include_router(router)
 
+# Close pooled inter-service HTTP connections on shutdown
+app.add_event_handler("shutdown", close_service_clients)
+
 # Initialize Prometheus metrics
 setup_metrics(app)
 
@@ -0,0 +1,64 @@
+"""
+Benchmark: resolving seat lock state for a train's tickets.
+
+Compares the old path (one EXISTS round trip per seat) with get_locked_seats
+(one MGET for the whole page) as the seat count grows. Needs a running Redis
+(REDIS_HOST / REDIS_PORT); uses its own train id and cleans up after itself.
+
+    python scripts/bench_seat_locks.py --seats 10 100 1000 5000 --repeat 20
+"""
+import argparse
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from api.redis_client import redis_client, get_locked_seats  # noqa: E402
+
+BENCH_TRAIN_ID = "bench"
+
+
+def per_seat_exists(train_id, seat_numbers):
+    # the pre-MGET implementation
+    return {seat for seat in seat_numbers if redis_client.exists(f"seat:{train_id}:{seat}")}
+
+
+def time_call(func, repeat, *args):
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func(*args)
+        samples.append((time.perf_counter() - start) * 1000)
+    return statistics.median(samples), max(samples)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--seats", type=int, nargs="+", default=[10, 100, 1000, 5000])
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--locked-ratio", type=float, default=0.1, help="fraction of seats holding a lock")
+    args = parser.parse_args()
+
+    print(f"{'seats':>7} {'exists p50 ms':>14} {'exists max ms':>14} {'mget p50 ms':>12} {'mget max ms':>12} {'speedup':>8}")
+    for count in args.seats:
+        seats = [f"S{index}" for index in range(count)]
+        locked = seats[: int(count * args.locked_ratio)]
+        if locked:
+            redis_client.mset({f"seat:{BENCH_TRAIN_ID}:{seat}": "bench" for seat in locked})
+        try:
+            assert per_seat_exists(BENCH_TRAIN_ID, seats) == get_locked_seats(BENCH_TRAIN_ID, seats)
+            exists_p50, exists_max = time_call(per_seat_exists, args.repeat, BENCH_TRAIN_ID, seats)
+            mget_p50, mget_max = time_call(get_locked_seats, args.repeat, BENCH_TRAIN_ID, seats)
+        finally:
+            if locked:
+                redis_client.delete(*[f"seat:{BENCH_TRAIN_ID}:{seat}" for seat in locked])
+        print(
+            f"{count:>7} {exists_p50:>14.2f} {exists_max:>14.2f} {mget_p50:>12.2f} {mget_max:>12.2f}"
+            f" {exists_p50 / mget_p50:>7.1f}x"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,107 @@
+"""
+Benchmark: ticket lookups with and without the 7c4e9b2a5d13 indexes.
+
+Seeds a scratch schema with --tickets rows (generate_series, --seats-per-train
+seats per train, ~70% booked), runs EXPLAIN ANALYZE for the booking, availability
+and next-free-seat queries before and after building the indexes, and prints
+plan node and execution time for each. Needs DATABASE_URL; the scratch schema
+is dropped afterwards.
+
+    python scripts/bench_ticket_indexes.py --tickets 10000000
+"""
+import argparse
+import json
+import os
+
+from sqlalchemy import create_engine, text
+
+SCHEMA = "bench_ticket_indexes"
+
+QUERIES = {
+    "book seat": "SELECT id FROM ticket WHERE train_id = :train_id AND seat_number = :seat_number",
+    "availability": "SELECT count(*) FROM ticket WHERE train_id = :train_id AND status = 'available'",
+    "next free seat": (
+        "SELECT id, seat_number FROM ticket WHERE train_id = :train_id AND status = 'available' ORDER BY id LIMIT 1"
+    ),
+}
+
+# same definitions as the migration, minus CONCURRENTLY (nothing else writes to the scratch schema)
+INDEXES = [
+    "CREATE UNIQUE INDEX uq_ticket_train_id_seat_number ON ticket (train_id, seat_number)",
+    "CREATE INDEX ix_ticket_train_id_status ON ticket (train_id, status)",
+    "CREATE INDEX ix_ticket_train_id_available ON ticket (train_id, id) WHERE status = 'available'",
+]
+
+
+def seed(conn, tickets, seats_per_train):
+    conn.execute(text(f"DROP SCHEMA IF EXISTS {SCHEMA} CASCADE"))
+    conn.execute(text(f"CREATE SCHEMA {SCHEMA}"))
+    conn.execute(text(f"SET search_path TO {SCHEMA}"))
+    conn.execute(text(
+        "CREATE TABLE train (id integer PRIMARY KEY, name varchar(50), source varchar(50), "
+        "destination varchar(50), departure_time timestamp)"
+    ))
+    conn.execute(text(
+        "CREATE TABLE ticket (id integer PRIMARY KEY, train_id integer REFERENCES train (id) ON DELETE CASCADE, "
+        "seat_number varchar(50), price float, status varchar(50) NOT NULL, buyer_id integer)"
+    ))
+    trains = (tickets + seats_per_train - 1) // seats_per_train
+    conn.execute(
+        text("INSERT INTO train (id, name, source, destination, departure_time) "
+             "SELECT i, 'Train ' || i, 'A', 'B', now() FROM generate_series(1, :trains) AS i"),
+        {"trains": trains},
+    )
+    conn.execute(
+        text("INSERT INTO ticket (id, train_id, seat_number, price, status, buyer_id) "
+             "SELECT i, (i - 1) / :seats + 1, 'S' || ((i - 1) % :seats), 100, "
+             "CASE WHEN random() < 0.7 THEN 'booked' ELSE 'available' END, NULL "
+             "FROM generate_series(1, :tickets) AS i"),
+        {"tickets": tickets, "seats": seats_per_train},
+    )
+    conn.execute(text("ANALYZE train"))
+    conn.execute(text("ANALYZE ticket"))
+    return trains
+
+
+def explain(conn, sql, params):
+    plan = conn.execute(text(f"EXPLAIN (ANALYZE, FORMAT JSON) {sql}"), params).scalar()
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    node = plan[0]["Plan"]
+    while node.get("Plans") and node["Node Type"] in ("Limit", "Aggregate", "Gather", "Gather Merge"):
+        node = node["Plans"][0]
+    return node["Node Type"], plan[0]["Execution Time"]
+
+
+def run_queries(conn, label, params):
+    for name, sql in QUERIES.items():
+        node_type, ms = explain(conn, sql, params)
+        print(f"{label:>10} {name:>15} {node_type:>24} {ms:>12.3f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--tickets", type=int, default=10_000_000)
+    parser.add_argument("--seats-per-train", type=int, default=500)
+    args = parser.parse_args()
+
+    engine = create_engine(os.environ["DATABASE_URL"], isolation_level="AUTOCOMMIT")
+    with engine.connect() as conn:
+        try:
+            trains = seed(conn, args.tickets, args.seats_per_train)
+            # a train from the middle of the table, so neither scan direction gets lucky
+            params = {"train_id": trains // 2 or 1, "seat_number": f"S{args.seats_per_train // 2}"}
+            print(f"{args.tickets} tickets over {trains} trains")
+            print(f"{'indexes':>10} {'query':>15} {'plan':>24} {'exec ms':>12}")
+            run_queries(conn, "none", params)
+            for statement in INDEXES:
+                conn.execute(text(statement))
+            conn.execute(text("ANALYZE ticket"))
+            run_queries(conn, "7c4e9b2a", params)
+        finally:
+            conn.execute(text(f"DROP SCHEMA IF EXISTS {SCHEMA} CASCADE"))
+    engine.dispose()
+
+
+if __name__ == "__main__":
+    main()